@@ -1,6 +1,10 @@
 from __future__ import annotations
 
+import argparse
+import queue
 import sys
+import threading
+import time
 import warnings
 from pathlib import Path
 
@@ -11,29 +15,99 @@ sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 from tqdm import tqdm
 from elasticsearch import helpers
 from src.es_client import get_client, get_config
-from src.utils import read_jsonl, get_data_dir
-from src.embed import embed_texts
+from src.utils import iter_jsonl, batched, get_data_dir, get_report_dir, peak_rss_mb
+from src.embed import embed_texts, embed_texts_cached
+from src.embed_cache import get_embedding_cache
+from src.memory import MemoryMonitor
+from src.profiling import Profiler
+
+_DONE = object()
+
+
+def produce_batches(docs_path: Path, batch_size: int, out: queue.Queue, cache=None) -> None:
+    """Read and embed documents batch by batch; the bounded queue applies backpressure."""
+    try:
+        for docs in batched(iter_jsonl(docs_path), batch_size):
+            texts = [f"{d['title']}\n\n{d['body']}" for d in docs]
+            vectors = embed_texts_cached(texts, cache) if cache is not None else embed_texts(texts)
+            out.put((docs, vectors))
+        out.put(_DONE)
+    except BaseException as e:
+        out.put(e)
+
+
+def iter_actions(index_name: str, batches: queue.Queue):
+    while True:
+        item = batches.get()
+        if item is _DONE:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        docs, vectors = item
+        for d, v in zip(docs, vectors):
+            yield {
+                "_index": index_name,
+                "_id": d["doc_id"],
+                "_source": {
+                    **d,
+                    "embedding": v,
+                }
+            }
+
 
 def main():
+    parser = argparse.ArgumentParser(description="Embed and bulk index documents in bounded, overlapping chunks")
+    parser.add_argument("--embed-batch-size", type=int, default=256, help="Documents per embed_texts call")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Documents per bulk request")
+    parser.add_argument("--queue-depth", type=int, default=4, help="Embedded batches buffered ahead of bulk indexing")
+    parser.add_argument("--no-embed-cache", action="store_true", help="Always re-embed instead of reusing cached vectors")
+    parser.add_argument("--profile", action="store_true", help="cProfile + stack samples per stage into report_dir/profiles/")
+    parser.add_argument("--memory", action="store_true", help="RSS timeline and per-stage peaks into report_dir/memory/")
+    parser.add_argument("--tracemalloc", action="store_true", help="With --memory: Python heap peaks and top allocation sites (slower)")
+    args = parser.parse_args()
+
     es = get_client()
     cfg = get_config()
     data_dir = get_data_dir()
-    docs = read_jsonl(data_dir / "documents.jsonl")
-    texts = [f"{d['title']}\n\n{d['body']}" for d in docs]
-    vectors = embed_texts(texts)
-    actions = []
-    for d, v in zip(docs, vectors):
-        actions.append({
-            "_index": cfg.index_name,
-            "_id": d["doc_id"],
-            "_source": {
-                **d,
-                "embedding": v,
-            }
-        })
+    report_dir = get_report_dir(data_dir)
+    profiler = Profiler(report_dir / "profiles" if args.profile else None, "03_index_documents")
+    memory = MemoryMonitor(report_dir / "memory" if args.memory else None, "03_index_documents", trace_python=args.tracemalloc)
+
+    cache = None if args.no_embed_cache else get_embedding_cache()
+    batches: queue.Queue = queue.Queue(maxsize=args.queue_depth)
+    producer = threading.Thread(
+        target=produce_batches,
+        args=(data_dir / "documents.jsonl", args.embed_batch_size, batches, cache),
+        daemon=True,
+    )
+
+    # Timers stop inside the stages: profiler and tracemalloc bookkeeping on exit is not indexing time
+    n_indexed = 0
+    with memory.stage("index"), profiler.stage("index"):
+        t0 = time.perf_counter()
+        producer.start()
+        with tqdm(desc="Indexing", unit="doc") as bar:
+            for ok, _ in helpers.streaming_bulk(es, iter_actions(cfg.index_name, batches), chunk_size=args.chunk_size):
+                if ok:
+                    n_indexed += 1
+                bar.update(1)
+        producer.join()
+        elapsed = time.perf_counter() - t0
+    with memory.stage("refresh"), profiler.stage("refresh"):
+        t0 = time.perf_counter()
+        es.indices.refresh(index=cfg.index_name)
+        elapsed += time.perf_counter() - t0
 
-    helpers.bulk(es, actions, refresh=True)
-    print(f"Indexed {len(actions)} documents into {cfg.index_name}")
+    rate = n_indexed / elapsed if elapsed > 0 else 0.0
+    print(f"Indexed {n_indexed} documents into {cfg.index_name}")
+    if cache is not None:
+        print(f"Embedding cache: {cache.hits} hits, {cache.misses} misses ({cache.dir})")
+    print(f"{elapsed:.1f}s, {rate:.1f} docs/sec, peak RSS {peak_rss_mb():.0f} MB")
+    if profiler.out_dir is not None:
+        print(f"Profiles: {profiler.out_dir}")
+    memory.close()
+    if memory.out_dir is not None:
+        print("Memory: " + ", ".join(f"{k} peak {v['rss_peak_mb']:.0f} MB" for k, v in memory.stages.items()))
 
 if __name__ == "__main__":
     main()
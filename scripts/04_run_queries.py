@@ -1,78 +1,63 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 import json
 import os
 import subprocess
 import sys
-import time
 import warnings
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
-from collections import defaultdict
 import pandas as pd
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 warnings.filterwarnings("ignore")
 
-from src.es_client import get_client, get_config
-from src.config import get_retrieval_config
-from src.utils import read_jsonl, write_json, get_data_dir, get_report_dir
-from src.embed import embed_texts
-from src.fusion import rrf_fuse
-from src.metrics import Qrels
-from src.rerank import rerank
-
-def load_qrels(data_dir: Path) -> Qrels:
-    qrels = defaultdict(dict)
-    with (data_dir / "qrels.tsv").open("r", encoding="utf-8") as f:
-        next(f)
-        for line in f:
-            qid, doc_id, rel = line.strip().split("\t")
-            qrels[qid][doc_id] = int(rel)
-    return Qrels(qrels=dict(qrels))
-
-
-def bm25_search(es, index: str, query: str, topn: int = 50) -> list:
-    resp = es.search(
-        index=index,
-        size=topn,
-        query={"multi_match": {"query": query, "fields": ["title^2", "body"]}},
-    )
-    return [hit["_id"] for hit in resp["hits"]["hits"]]
-
-
-def knn_search(es, index: str, query_vec: list, topn: int = 50, candidates: int = 100) -> list:
-    resp = es.search(
-        index=index,
-        size=topn,
-        knn={
-            "field": "embedding",
-            "query_vector": query_vec,
-            "k": topn,
-            "num_candidates": candidates,
-        },
-    )
-    return [hit["_id"] for hit in resp["hits"]["hits"]]
-
-
-def fetch_doc_texts(es, index: str, doc_ids: list) -> dict:
-    mget = es.mget(index=index, ids=doc_ids)
-    out = {}
-    for doc in mget["docs"]:
-        if not doc.get("found"):
-            continue
-        src = doc["_source"]
-        out[doc["_id"]] = f"{src.get('title','')}\n\n{src.get('body','')}"
-    return out
-
-
-def timed(fn, *args, **kwargs):
-    t0 = time.perf_counter()
-    out = fn(*args, **kwargs)
-    return out, (time.perf_counter() - t0) * 1000
+from src.es_client import get_client, get_async_client, get_config
+from src.config import get_cascade_config, get_retrieval_config
+from src.es_calls import FIELDS as ES_CALL_FIELDS
+from src.utils import read_jsonl, write_json, write_text, batched, get_data_dir, get_report_dir
+from src.checkpoint import CheckpointLog, iter_records
+from src.pipeline import process_query, process_query_async, process_window
+from src.memory import MemoryMonitor
+from src.profiling import Profiler
+from src.rerank import rerank_stats, warm_up
+from src.rerank_cache import get_rerank_cache
+from src.tracing import configure, get_trace_path, write_summary
+
+
+async def run_concurrent(queries: list, index: str, rcfg, concurrency: int, commit) -> None:
+    """Keep up to `concurrency` queries in flight; commit results strictly in query order.
+
+    Committing in order keeps runs.json/latency.csv a prefix of queries.jsonl, which is
+    what resume relies on.
+    """
+    aes = get_async_client()
+    todo: asyncio.Queue = asyncio.Queue()
+    for i, q in enumerate(queries):
+        todo.put_nowait((i, q))
+    finished = {}
+    next_commit = 0
+
+    async def worker():
+        nonlocal next_commit
+        while True:
+            try:
+                i, q = todo.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            finished[i] = await process_query_async(aes, index, rcfg, q)
+            while next_commit in finished:
+                commit(finished.pop(next_commit))
+                next_commit += 1
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        await aes.close()
 
 
 def load_existing_runs(report_dir: Path) -> tuple[dict, list]:
@@ -89,6 +74,51 @@ def load_existing_runs(report_dir: Path) -> tuple[dict, list]:
     return runs, latency_rows
 
 
+def legacy_records(report_dir: Path) -> list:
+    """Records for a run saved before checkpoint.jsonl existed (runs.json + latency.csv only)."""
+    runs, latency_rows = load_existing_runs(report_dir)
+    records = []
+    for row in latency_rows:
+        qid = row["query_id"]
+        if not all(qid in runs.get(s, {}) for s in ("bm25", "knn", "hybrid_rrf", "hybrid_rrf_rerank")):
+            break
+        records.append({
+            "query_id": qid,
+            "runs": {system: ids[qid] for system, ids in runs.items() if qid in ids},
+            "latency": row,
+        })
+    return records
+
+
+def compact(report_dir: Path, checkpoint_path: Path) -> int:
+    """Fold the checkpoint log into runs.json / latency.csv (+ es_calls.csv, es_profiles.jsonl); returns the number of queries."""
+    runs = {"bm25": {}, "knn": {}, "hybrid_rrf": {}, "hybrid_rrf_rerank": {}}
+    latency_rows = []
+    es_rows = []
+    profiles = []
+    for record in iter_records(checkpoint_path):
+        for system, ids in record["runs"].items():
+            runs.setdefault(system, {})[record["query_id"]] = ids
+        latency_rows.append(record["latency"])
+        es_rows.extend(record.get("es_calls", []))
+        profiles.extend(record.get("es_profiles", []))
+    save_runs(report_dir, runs, latency_rows)
+    # Always rewritten or removed, so a file left by an earlier run never outlives its checkpoint
+    es_calls_path = report_dir / "es_calls.csv"
+    profiles_path = report_dir / "es_profiles.jsonl"
+    if es_rows:
+        tmp = report_dir / "es_calls.csv.tmp"
+        pd.DataFrame(es_rows, columns=ES_CALL_FIELDS).to_csv(tmp, index=False)
+        tmp.replace(es_calls_path)
+    else:
+        es_calls_path.unlink(missing_ok=True)
+    if profiles:
+        write_text(profiles_path, "".join(json.dumps(p) + "\n" for p in profiles))
+    else:
+        profiles_path.unlink(missing_ok=True)
+    return len(latency_rows)
+
+
 def save_runs(report_dir: Path, runs: dict, latency_rows: list) -> None:
     report_dir.mkdir(parents=True, exist_ok=True)
     runs_path = report_dir / "runs.json"
@@ -118,14 +148,54 @@ def main():
         action="store_true",
         help="Run in background; logs go to report_dir/progress.log",
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Queries in flight at once (AsyncElasticsearch); 1 runs sequentially",
+    )
+    parser.add_argument(
+        "--msearch-window",
+        type=int,
+        default=0,
+        help="Batch BM25 + kNN for this many queries into one _msearch round trip (0 = off)",
+    )
+    parser.add_argument(
+        "--fsync-every",
+        type=int,
+        default=50,
+        help="fsync the checkpoint log after this many queries",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="cProfile + stack samples per stage (warm_up, queries, compact) into report_dir/profiles/",
+    )
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="RSS timeline and per-stage peaks (load, warm_up, queries, compact) into report_dir/memory/",
+    )
+    parser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="With --memory: Python heap peaks and top allocation sites (slower)",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Write per-stage spans to report_dir/trace.jsonl (or TRACE_PATH) and their percentiles to trace_summary.json",
+    )
     args = parser.parse_args()
+    if args.concurrency > 1 and args.msearch_window > 0:
+        parser.error("--concurrency and --msearch-window are mutually exclusive")
 
     if args.detached:
         script = Path(__file__).resolve()
         cwd = script.parents[1]
         env = os.environ.copy()
         proc = subprocess.Popen(
-            [sys.executable, str(script)],
+            [sys.executable, str(script), *[a for a in sys.argv[1:] if a != "--detached"]],
             cwd=cwd,
             env=env,
             stdin=subprocess.DEVNULL,
@@ -150,20 +220,23 @@ def main():
 
     es = get_client()
     cfg = get_config()
-    queries = read_jsonl(data_dir / "queries.jsonl")
-    total = len(queries)
-
-    runs, latency_rows = load_existing_runs(report_dir)
-    n_done = min(
-        len(latency_rows),
-        len(runs.get("bm25", {})),
-        len(runs.get("knn", {})),
-        len(runs.get("hybrid_rrf", {})),
-        len(runs.get("hybrid_rrf_rerank", {})),
-    )
-    remaining = queries[n_done:]
+    memory = MemoryMonitor(report_dir / "memory" if args.memory else None, "04_run_queries", trace_python=args.tracemalloc)
+    with memory.stage("load"):
+        queries = read_jsonl(data_dir / "queries.jsonl")
+        total = len(queries)
+
+        checkpoint_path = report_dir / "checkpoint.jsonl"
+        if not checkpoint_path.exists():
+            with CheckpointLog(checkpoint_path) as ckpt:
+                for record in legacy_records(report_dir):
+                    ckpt.append(record)
+        n_done = sum(1 for _ in iter_records(checkpoint_path))
+        remaining = queries[n_done:]
 
     if not remaining:
+        if not (report_dir / "runs.json").exists():
+            compact(report_dir, checkpoint_path)
+        memory.close()
         log(f"All {total} queries already completed. Run 05_compute_metrics.py for final metrics.", log_file, args.detached)
         return
 
@@ -171,46 +244,94 @@ def main():
         log(f"Resuming: {n_done} done, {len(remaining)} remaining", log_file, args.detached)
 
     rcfg = get_retrieval_config()
+    profiler = Profiler(report_dir / "profiles" if args.profile else None, "04_run_queries")
+    with memory.stage("warm_up"), profiler.stage("warm_up"):
+        warm_up()
+    trace_path = get_trace_path() or (report_dir / "trace.jsonl" if args.trace else None)
+    tracer = configure(trace_path)
 
     last_pct = -1
-    for i, q in enumerate(remaining):
-        qid = q["query_id"]
-        qtext = q["query"]
+    n_committed = 0
+    ckpt = CheckpointLog(checkpoint_path, fsync_every=args.fsync_every)
 
-        (qvec,) = embed_texts([qtext])
+    def commit(record: dict) -> None:
+        nonlocal last_pct, n_committed
+        ckpt.append(record)
 
-        bm25_ids, bm25_ms = timed(bm25_search, es, cfg.index_name, qtext, rcfg.topn)
-        knn_ids, knn_ms = timed(knn_search, es, cfg.index_name, qvec, rcfg.topn, rcfg.knn_candidates)
-        fused_pairs, fusion_ms = timed(rrf_fuse, [bm25_ids, knn_ids], rcfg.rrf_k, rcfg.rerank_topn)
-        fused_ids = [doc_id for doc_id, _ in fused_pairs]
-
-        doc_texts = fetch_doc_texts(es, cfg.index_name, fused_ids[:rcfg.rerank_topn])
-        rerank_input = [(doc_id, doc_texts.get(doc_id, "")) for doc_id in fused_ids[:rcfg.rerank_topn]]
-        reranked_pairs, rerank_ms = timed(rerank, qtext, rerank_input)
-        reranked_ids = [doc_id for doc_id, _ in reranked_pairs] + fused_ids[rcfg.rerank_topn:]
-
-        runs["bm25"][qid] = bm25_ids
-        runs["knn"][qid] = knn_ids
-        runs["hybrid_rrf"][qid] = fused_ids
-        runs["hybrid_rrf_rerank"][qid] = reranked_ids
-
-        latency_rows.append({
-            "query_id": qid,
-            "bm25_ms": bm25_ms,
-            "knn_ms": knn_ms,
-            "fusion_ms": fusion_ms,
-            "rerank_ms": rerank_ms,
-            "total_ms": bm25_ms + knn_ms + fusion_ms + rerank_ms,
-        })
-
-        save_runs(report_dir, runs, latency_rows)
-
-        done = n_done + i + 1
+        n_committed += 1
+        done = n_done + n_committed
         pct = int(100 * done / total)
         if pct >= last_pct + 10 or done == total:
             last_pct = pct
-            log(f"Progress: {done}/{total} ({pct}%) — last: {qid}", log_file, args.detached)
+            log(f"Progress: {done}/{total} ({pct}%) — last: {record['query_id']}", log_file, args.detached)
+
+    try:
+        with memory.stage("queries"), profiler.stage("queries"):
+            if args.concurrency > 1:
+                asyncio.run(run_concurrent(remaining, cfg.index_name, rcfg, args.concurrency, commit))
+            elif args.msearch_window > 0:
+                for window in batched(remaining, args.msearch_window):
+                    for record in process_window(es, cfg.index_name, rcfg, window):
+                        commit(record)
+            else:
+                for q in remaining:
+                    commit(process_query(es, cfg.index_name, rcfg, q))
+    finally:
+        ckpt.close()
+        with memory.stage("compact"), profiler.stage("compact"):
+            compact(report_dir, checkpoint_path)
+        memory.close()
+        if tracer is not None:
+            configure(None)
+
+    cache = get_rerank_cache()
+    if cache is not None:
+        st = cache.stats()
+        log(f"Rerank cache: {st['hits']} hits, {st['misses']} misses ({st['hit_rate']:.1%})", log_file, args.detached)
+    pad = rerank_stats()
+    if pad["pairs"]:
+        log(
+            f"Rerank padding (estimated in characters, bucketing {'on' if pad['bucketing'] else 'off'}): "
+            f"{pad['pairs']} pairs, {pad['char_clipped']} documents clipped by characters, "
+            f"efficiency {pad['efficiency_sorted']:.1%} length-sorted vs {pad['efficiency_unsorted']:.1%} arrival order",
+            log_file, args.detached,
+        )
+    if tracer is not None:
+        summary = write_summary(tracer, report_dir / "trace_summary.json")
+        log(
+            "Trace p50/p99 ms: " + ", ".join(f"{name} {st['p50']:.1f}/{st['p99']:.1f}" for name, st in summary.items()),
+            log_file, args.detached,
+        )
+    lat = pd.read_csv(report_dir / "latency.csv")
+    if "other_ms" in lat:
+        log(
+            f"Latency: wall {lat['wall_ms'].mean():.1f} ms/query, total {lat['total_ms'].mean():.1f} "
+            f"(embed {lat['embed_ms'].mean():.1f}, fetch {lat['fetch_ms'].mean():.1f}), "
+            f"outside any stage {lat['other_ms'].mean():.1f}",
+            log_file, args.detached,
+        )
+    es_path = report_dir / "es_calls.csv"
+    if es_path.exists():
+        calls = pd.read_csv(es_path)
+        for op, g in calls.groupby("op"):
+            log(
+                f"ES {op}: {len(g)} calls, took {g['took_ms'].mean():.1f} ms, network {g['network_ms'].mean():.1f}, "
+                f"encode {g['encode_ms'].mean():.2f}, decode {g['decode_ms'].mean():.2f}, "
+                f"client {g['client_ms'].mean():.2f}, {g['response_bytes'].mean() / 1024:.1f} KiB/response",
+                log_file, args.detached,
+            )
+    if get_cascade_config().enabled and "rerank_pairs" in lat:
+        log(
+            f"Rerank cascade: {lat['rerank_pairs'].mean():.1f} pairs/query, "
+            f"{lat['rerank_pairs_saved'].mean():.1f} saved/query",
+            log_file, args.detached,
+        )
 
+    if profiler.out_dir is not None:
+        log(f"Profiles: {profiler.out_dir}", log_file, args.detached)
+    if memory.out_dir is not None:
+        log("Memory: " + ", ".join(f"{k} peak {v['rss_peak_mb']:.0f} MB" for k, v in memory.stages.items()),
+            log_file, args.detached)
     log(f"Done. {total} queries in {report_dir}. Run 05_compute_metrics.py for metrics.", log_file, args.detached)
 
 
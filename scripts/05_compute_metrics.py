@@ -1,27 +1,51 @@
 from __future__ import annotations
 
+import argparse
 import json
 import sys
-from collections import defaultdict
+import time
 from pathlib import Path
 
+import pandas as pd
+
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from src.utils import get_data_dir, get_report_dir, write_json, write_text
-from src.metrics import Qrels, evaluate_run
+from src.metrics import evaluate_runs, load_qrels
+from src.memory import MemoryMonitor
+from src.profiling import Profiler
+from src.significance import align, paired_tests
+
 
+TESTED_METRICS = ["ndcg@10", "mrr@10", "recall@50"]
 
-def load_qrels(data_dir: Path) -> Qrels:
-    qrels = defaultdict(dict)
-    with (data_dir / "qrels.tsv").open("r", encoding="utf-8") as f:
-        next(f)
-        for line in f:
-            qid, doc_id, rel = line.strip().split("\t")
-            qrels[qid][doc_id] = int(rel)
-    return Qrels(qrels=dict(qrels))
+
+def per_query_table(scores: dict, latency_path: Path) -> pd.DataFrame:
+    """One row per query: each system's metrics, the rerank gain over hybrid_rrf, and rerank depth from latency.csv."""
+    frames = [
+        pd.DataFrame({f"{name}_{m}": s.scores[m] for m in TESTED_METRICS}, index=pd.Index(s.query_ids, name="query_id"))
+        for name, s in scores.items()
+    ]
+    df = pd.concat(frames, axis=1)
+    for m in TESTED_METRICS:
+        if f"hybrid_rrf_rerank_{m}" in df and f"hybrid_rrf_{m}" in df:
+            df[f"rerank_gain_{m}"] = df[f"hybrid_rrf_rerank_{m}"] - df[f"hybrid_rrf_{m}"]
+    if latency_path.exists():
+        lat = pd.read_csv(latency_path).set_index("query_id")
+        cols = [c for c in ("rerank_ms", "rerank_pairs", "rerank_pairs_saved", "cascade_stop") if c in lat]
+        df = df.join(lat[cols])
+    return df.reset_index()
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Compute metrics and paired significance tests from runs.json")
+    parser.add_argument("--resamples", type=int, default=10000, help="Bootstrap / randomization resamples")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", action="store_true", help="cProfile + stack samples per stage into report_dir/profiles/")
+    parser.add_argument("--memory", action="store_true", help="RSS timeline and per-stage peaks into report_dir/memory/")
+    parser.add_argument("--tracemalloc", action="store_true", help="With --memory: Python heap peaks and top allocation sites (slower)")
+    args = parser.parse_args()
+
     data_dir = get_data_dir()
     report_dir = get_report_dir(data_dir)
     runs_path = report_dir / "runs.json"
@@ -30,23 +54,72 @@ def main():
         print(f"Run 04_run_queries.py first. Expected: {runs_path}")
         sys.exit(1)
 
-    runs = json.loads(runs_path.read_text(encoding="utf-8"))
-    qrels = load_qrels(data_dir)
+    profiler = Profiler(report_dir / "profiles" if args.profile else None, "05_compute_metrics")
+    memory = MemoryMonitor(report_dir / "memory" if args.memory else None, "05_compute_metrics", trace_python=args.tracemalloc)
+    with memory.stage("evaluate"), profiler.stage("evaluate"):
+        runs = json.loads(runs_path.read_text(encoding="utf-8"))
+        qrels = load_qrels(data_dir)
+        scores = evaluate_runs(runs, qrels, cutoffs=(10, 50))
+    metrics = {name: s.means() for name, s in scores.items()}
 
-    metrics = {}
-    for name, run in runs.items():
-        metrics[name] = evaluate_run(run, qrels)
+    t0 = time.perf_counter()
+    names = list(scores)
+    query_ids = {name: scores[name].query_ids for name in names}
+    per_metric = {
+        metric: align(query_ids, {name: scores[name].scores[metric] for name in names})
+        for metric in TESTED_METRICS
+    }
+    with memory.stage("significance"), profiler.stage("significance"):
+        tests = paired_tests(per_metric, names, n_resamples=args.resamples, seed=args.seed)
+        for t in tests:
+            sig = metrics[t["system"]].setdefault("significance", {}).setdefault(t["baseline"], {})
+            sig[t["metric"]] = {k: t[k] for k in ("diff", "ci_low", "ci_high", "p_bootstrap", "p_randomization")}
+        # Before the stages exit: their profiler/tracemalloc bookkeeping is not significance time
+        sig_secs = time.perf_counter() - t0
 
     write_json(report_dir / "metrics.json", metrics)
+    with memory.stage("per_query"), profiler.stage("per_query"):
+        per_query = per_query_table(scores, report_dir / "latency.csv")
+        per_query.to_csv(report_dir / "per_query_metrics.csv", index=False)
 
     lines = []
     lines.append("# Experiment Results\n")
-    lines.append("| System | NDCG@10 | MRR@10 | Recall@50 | #Queries |\n|---|---:|---:|---:|---:|")
+    lines.append("| System | NDCG@10 | MRR@10 | Recall@50 | MAP@50 | P@10 | #Queries |\n|---|---:|---:|---:|---:|---:|---:|")
     for name, m in metrics.items():
-        lines.append(f"| {name} | {m['ndcg@10']:.4f} | {m['mrr@10']:.4f} | {m['recall@50']:.4f} | {m['num_queries']} |")
+        lines.append(
+            f"| {name} | {m['ndcg@10']:.4f} | {m['mrr@10']:.4f} | {m['recall@50']:.4f} "
+            f"| {m['map@50']:.4f} | {m['p@10']:.4f} | {m['num_queries']} |"
+        )
+    if tests:
+        lines.append(f"\n## Paired significance ({args.resamples:,} resamples)\n")
+        lines.append("| System | Baseline | Metric | Δ | 95% CI | p (bootstrap) | p (randomization) |\n|---|---|---|---:|---:|---:|---:|")
+        for t in tests:
+            lines.append(
+                f"| {t['system']} | {t['baseline']} | {t['metric']} | {t['diff']:+.4f} "
+                f"| [{t['ci_low']:+.4f}, {t['ci_high']:+.4f}] | {t['p_bootstrap']:.4f} | {t['p_randomization']:.4f} |"
+            )
+    if "rerank_pairs" in per_query and per_query["rerank_pairs"].notna().any():
+        pairs = per_query["rerank_pairs"].dropna()
+        saved = per_query["rerank_pairs_saved"].dropna()
+        lines.append("\n## Rerank depth\n")
+        lines.append(
+            f"Mean pairs scored per query: {pairs.mean():.1f} (p50 {pairs.median():.0f}, max {pairs.max():.0f}); "
+            f"mean pairs saved: {saved.mean():.1f} ({saved.sum() / max(pairs.sum() + saved.sum(), 1):.1%})."
+        )
+        stops = per_query["cascade_stop"].dropna() if "cascade_stop" in per_query else pd.Series(dtype=str)
+        stops = stops[stops != ""]
+        if len(stops):
+            counts = ", ".join(f"{k}: {v}" for k, v in stops.value_counts().items())
+            lines.append(f"Cascade stop reasons: {counts}. Per-query quality and depth are in `per_query_metrics.csv`.")
     write_text(report_dir / "metrics.md", "\n".join(lines) + "\n")
 
-    print(f"Wrote {report_dir}/metrics.json, metrics.md")
+    print(f"Significance tests: {len(tests)} comparisons in {sig_secs:.2f}s")
+    print(f"Wrote {report_dir}/metrics.json, metrics.md, per_query_metrics.csv")
+    if profiler.out_dir is not None:
+        print(f"Profiles: {profiler.out_dir}")
+    memory.close()
+    if memory.out_dir is not None:
+        print("Memory: " + ", ".join(f"{k} peak {v['rss_peak_mb']:.0f} MB" for k, v in memory.stages.items()))
 
 
 if __name__ == "__main__":
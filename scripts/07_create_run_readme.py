@@ -17,6 +17,46 @@ def count_lines(path: Path) -> int:
         return sum(1 for _ in f)
 
 
+def hotspot_lines(path: Path, top: int = 8) -> list:
+    """Run README section from profiles/hotspots.json (written by --profile on 03/04/05)."""
+    hotspots = json.loads(path.read_text(encoding="utf-8"))
+    lines = ["\n## Hotspots\n", "Top self-time functions per profiled stage (cProfile, calling thread), "
+             "then the most sampled frames across busy threads (blocked waits excluded). Files are in `profiles/`.\n"]
+    for stage, h in hotspots.items():
+        lines.append(f"\n### {stage} ({h['wall_s']:.1f}s)\n")
+        lines.append("| Function | Calls | Self s | Cumulative s |\n")
+        lines.append("|----------|------:|-------:|-------------:|\n")
+        for f in h["cprofile"][:top]:
+            lines.append(f"| `{f['function']}` | {f['ncalls']:,} | {f['tottime_s']:.3f} | {f['cumtime_s']:.3f} |\n")
+        if h["sampled"]:
+            frames = ", ".join(f"`{f['frame']}` {f['share']:.0%}" for f in h["sampled"][:5])
+            idle = f", {h['idle_share']:.0%} of thread samples idle" if "idle_share" in h else ""
+            lines.append(f"\nSampled ({h['samples']} samples{idle}): {frames}\n")
+    return lines
+
+
+def memory_lines(path: Path) -> list:
+    """Run README section from memory/peaks.json (written by --memory on 03/04/05)."""
+    peaks = json.loads(path.read_text(encoding="utf-8"))
+    lines = ["\n## Peak memory\n", "| Stage | Seconds | RSS start MB | RSS peak MB | RSS end MB | Python heap peak MB |\n",
+             "|-------|--------:|-------------:|------------:|-----------:|--------------------:|\n"]
+    for stage, m in peaks.items():
+        if "seconds" not in m:  # whole-process row
+            lines.append(f"| {stage} | | | **{m['rss_peak_mb']:,.0f}** | | |\n")
+            continue
+        heap = f"{m['heap_peak_mb']:,.1f}" if "heap_peak_mb" in m else ""
+        lines.append(
+            f"| {stage} | {m['seconds']:.1f} | {m['rss_start_mb']:,.0f} | {m['rss_peak_mb']:,.0f} "
+            f"| {m['rss_end_mb']:,.0f} | {heap} |\n"
+        )
+    sites = [(stage, site) for stage, m in peaks.items() for site in m.get("top_sites", [])[:3]]
+    if sites:
+        lines.append("\nLargest live Python allocations at stage end (`--tracemalloc`):\n\n")
+        for stage, site in sites:
+            lines.append(f"- {stage}: `{site['site']}` {site['mb']:,.1f} MB in {site['blocks']:,} blocks\n")
+    return lines
+
+
 def main():
     data_dir = get_data_dir()
     report_dir = get_report_dir(data_dir)
@@ -69,10 +109,27 @@ def main():
     lines.append("|--------|--------:|-------:|----------:|\n")
     for name, m in metrics.items():
         lines.append(f"| {name} | {m['ndcg@10']:.4f} | {m['mrr@10']:.4f} | {m['recall@50']:.4f} |\n")
+    hotspots_path = report_dir / "profiles" / "hotspots.json"
+    if hotspots_path.exists():
+        lines.extend(hotspot_lines(hotspots_path))
+    memory_path = report_dir / "memory" / "peaks.json"
+    if memory_path.exists():
+        lines.extend(memory_lines(memory_path))
     lines.append("\n## Outputs\n")
     lines.append("- `runs.json` — ranked doc IDs per query per system\n")
-    lines.append("- `latency.csv` — per-query latency breakdown (bm25_ms, knn_ms, fusion_ms, rerank_ms)\n")
+    lines.append("- `latency.csv` — per-query latency breakdown (embed_ms, bm25_ms, knn_ms, fusion_ms, fetch_ms, rerank_ms, wall_ms, other_ms) and rerank depth (rerank_pairs, rerank_pairs_saved)\n")
+    if (report_dir / "es_calls.csv").exists():
+        lines.append("- `es_calls.csv` — one row per Elasticsearch call: took, transport/network ms, JSON encode/decode ms, request/response bytes\n")
+    if (report_dir / "es_profiles.jsonl").exists():
+        lines.append("- `es_profiles.jsonl` — search `profile` output for calls slower than `ES_PROFILE_SLOW_MS`\n")
+    if (report_dir / "trace_summary.json").exists():
+        lines.append("- `trace.jsonl` / `trace_summary.json` — nested per-stage spans and their percentiles (04 `--trace`)\n")
+    if hotspots_path.exists():
+        lines.append("- `profiles/` — `<script>.<stage>.pstats` (cProfile), `.collapsed` stack samples (flamegraph.pl / speedscope), `hotspots.json`\n")
+    if memory_path.exists():
+        lines.append("- `memory/` — `<script>.timeline.csv` (RSS / Python heap every 0.25s, tagged by stage) and `peaks.json`\n")
     lines.append("- `metrics.json` / `metrics.md` — aggregated metrics\n")
+    lines.append("- `per_query_metrics.csv` — per-query metrics per system, rerank gain and rerank depth\n")
     lines.append("- `*.png` — bar chart, radar, latency breakdown, tradeoff scatter\n")
 
     out = report_dir / "README.md"
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import argparse
+import itertools
+import sys
+import time
+import warnings
+from pathlib import Path
+
+warnings.filterwarnings("ignore")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+
+from src.rerank_http import RerankHttpClient
+from src.utils import batched, get_data_dir, iter_jsonl, read_jsonl
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a RERANK_MODE=http endpoint (e.g. rerank_stub_server.py)")
+    parser.add_argument("--url", default="http://127.0.0.1:8081/")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--docs-per-query", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=1, help="Queries per request payload")
+    parser.add_argument("--window", type=int, default=32, help="Queries handed to rerank_many at a time")
+    args = parser.parse_args()
+
+    data_dir = get_data_dir()
+    queries = read_jsonl(data_dir / "queries.jsonl")[:args.queries]
+    docs = [
+        (d["doc_id"], f"{d['title']}\n\n{d['body']}")
+        for d in itertools.islice(iter_jsonl(data_dir / "documents.jsonl"), args.docs_per_query)
+    ]
+    items = [(q["query"], docs) for q in queries]
+
+    client = RerankHttpClient(args.url, concurrency=args.concurrency, batch_size=args.batch)
+    client.rerank_many(items[:1])  # open a connection before timing
+
+    window_ms = []
+    t0 = time.perf_counter()
+    for window in batched(items, args.window):
+        t = time.perf_counter()
+        client.rerank_many(window)
+        window_ms.append((time.perf_counter() - t) * 1000)
+    elapsed = time.perf_counter() - t0
+    client.close()
+
+    n_pairs = len(items) * len(docs)
+    print(f"{len(items)} queries x {len(docs)} docs, concurrency={args.concurrency}, batch={args.batch}")
+    print(f"{elapsed:.2f}s, {len(items) / elapsed:.1f} queries/s, {n_pairs / elapsed:.0f} pairs/s")
+    print(f"per-window ms ({args.window} queries): p50={np.percentile(window_ms, 50):.1f} p95={np.percentile(window_ms, 95):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import sys
+import time
+import warnings
+from pathlib import Path
+
+warnings.filterwarnings("ignore")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+
+from src.config import get_embedding_model, get_rerank_batch_size, get_rerank_max_length, get_reranker_model
+from src.embed import embed_texts
+from src.inference import BACKENDS
+from src.metrics import evaluate_runs, load_qrels
+from src.rerank import get_cross_encoder
+from src.search import doc_text
+from src.utils import get_data_dir, get_report_dir, iter_jsonl, read_jsonl
+
+
+def load_candidates(data_dir: Path, queries: list, depth: int) -> dict:
+    """Per-query candidates from the last hybrid_rrf run if there is one, else the first `depth` documents."""
+    runs_path = get_report_dir(data_dir) / "runs.json"
+    if runs_path.exists():
+        hybrid = json.loads(runs_path.read_text(encoding="utf-8")).get("hybrid_rrf", {})
+        if hybrid:
+            return {q["query_id"]: hybrid.get(q["query_id"], [])[:depth] for q in queries}
+    first = [d["doc_id"] for d in itertools.islice(iter_jsonl(data_dir / "documents.jsonl"), depth)]
+    return {q["query_id"]: first for q in queries}
+
+
+def rank_corr(a: np.ndarray, b: np.ndarray) -> float:
+    ra, rb = np.argsort(np.argsort(a)), np.argsort(np.argsort(b))
+    return float(np.corrcoef(ra, rb)[0, 1]) if len(a) > 1 else 1.0
+
+
+def timed(fn, inputs: list, warm: int = 8):
+    """fn(inputs) and its wall time; a small warm-up call first so lazy init is not timed."""
+    fn(inputs[:warm])
+    t = time.perf_counter()
+    out = fn(inputs)
+    return out, time.perf_counter() - t
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare a quantized INFERENCE_BACKEND against fp32 torch")
+    parser.add_argument("--backend", choices=[b for b in BACKENDS if b != "torch"], default="int8")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--docs-per-query", type=int, default=50)
+    args = parser.parse_args()
+
+    data_dir = get_data_dir()
+    queries = read_jsonl(data_dir / "queries.jsonl")[:args.queries]
+    candidates = load_candidates(data_dir, queries, args.docs_per_query)
+    wanted = set(itertools.chain.from_iterable(candidates.values()))
+    texts = {d["doc_id"]: doc_text(d) for d in iter_jsonl(data_dir / "documents.jsonl") if d["doc_id"] in wanted}
+    items = [(q["query"], [(d, texts[d]) for d in candidates[q["query_id"]] if d in texts]) for q in queries]
+    n_pairs = sum(len(docs) for _, docs in items)
+    doc_list = list(texts.values())
+
+    report = {"backend": args.backend, "queries": len(items), "pairs": n_pairs, "docs": len(doc_list)}
+
+    # Bi-encoder: cosine between fp32 and backend vectors (both are L2-normalized)
+    embed = {}
+    for backend in ("torch", args.backend):
+        embed[backend] = timed(lambda xs, b=backend: np.asarray(embed_texts(xs, backend=b)), doc_list)
+    cos = np.sum(embed["torch"][0] * embed[args.backend][0], axis=1)
+    report["embedding"] = {
+        "model": get_embedding_model(),
+        "cosine_mean": float(cos.mean()),
+        "cosine_min": float(cos.min()),
+        "fp32_docs_per_s": len(doc_list) / embed["torch"][1],
+        "backend_docs_per_s": len(doc_list) / embed[args.backend][1],
+        "speedup": embed["torch"][1] / embed[args.backend][1],
+    }
+
+    # Cross-encoder: raw score agreement, top-10 agreement and the end-to-end quality cost
+    pairs = [[q, t] for q, docs in items for _, t in docs]
+    scored = {}
+    for backend in ("torch", args.backend):
+        model = get_cross_encoder(None, None, backend)
+        scored[backend] = timed(lambda xs, m=model: np.asarray(m.predict(xs, batch_size=get_rerank_batch_size(), show_progress_bar=False)), pairs)
+    ref, alt = scored["torch"][0], scored[args.backend][0]
+
+    runs = {}
+    for backend, (scores, _) in scored.items():
+        run, pos = {}, 0
+        for q, (_, docs) in zip(queries, items):
+            chunk = scores[pos:pos + len(docs)]
+            pos += len(docs)
+            run[q["query_id"]] = [docs[i][0] for i in np.argsort(-chunk, kind="stable")]
+        runs[backend] = run
+    top10 = [len(set(runs["torch"][qid][:10]) & set(runs[args.backend][qid][:10])) / 10 for qid in runs["torch"]]
+    report["rerank"] = {
+        "model": get_reranker_model(),
+        "max_length": get_rerank_max_length(),
+        "score_pearson": float(np.corrcoef(ref, alt)[0, 1]),
+        "score_spearman": rank_corr(ref, alt),
+        "score_max_abs_diff": float(np.abs(ref - alt).max()),
+        "top10_overlap": float(np.mean(top10)),
+        "fp32_pairs_per_s": n_pairs / scored["torch"][1],
+        "backend_pairs_per_s": n_pairs / scored[args.backend][1],
+        "speedup": scored["torch"][1] / scored[args.backend][1],
+    }
+    qrels_path = data_dir / "qrels.tsv"
+    if qrels_path.exists():
+        means = {b: s.means() for b, s in evaluate_runs(runs, load_qrels(data_dir)).items()}
+        report["rerank"]["quality"] = {
+            m: {"fp32": means["torch"][m], args.backend: means[args.backend][m], "delta": means[args.backend][m] - means["torch"][m]}
+            for m in ("ndcg@10", "mrr@10")
+        }
+
+    out_path = get_report_dir(data_dir) / f"parity_{args.backend}.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(json.dumps(report, indent=2))
+    print(f"Wrote {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+import warnings
+from pathlib import Path
+
+warnings.filterwarnings("ignore")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+from tqdm import tqdm
+
+from src.config import get_retrieval_config
+from src.embed import embed_texts
+from src.es_client import get_client, get_config
+from src.fusion import rrf_fuse
+from src.metrics import evaluate_runs, load_qrels
+from src.rerank_embedding import DEFAULT_WEIGHTS, FEATURES, candidate_features, rerank_embedding
+from src.search import MSEARCH_FILTER_PATH, bm25_body, hit_ids, knn_body
+from src.utils import batched, get_data_dir, get_report_dir, read_jsonl
+
+
+def collect(es, index: str, rcfg, queries: list, window: int) -> list:
+    """Fused candidates with stored vectors and rank features for every query."""
+    out = []
+    for chunk in tqdm(list(batched(queries, window)), desc="Retrieving"):
+        texts = [q["query"] for q in chunk]
+        vecs = embed_texts(texts)
+        searches = []
+        for qtext, qvec in zip(texts, vecs):
+            searches += [{"index": index}, bm25_body(qtext, rcfg.topn, False, True)]
+            searches += [{"index": index}, knn_body(qvec, rcfg.topn, rcfg.knn_candidates, False, True)]
+        responses = es.msearch(searches=searches, filter_path=MSEARCH_FILTER_PATH)["responses"]
+        for j, (q, qvec) in enumerate(zip(chunk, vecs)):
+            vectors = {}
+            bm25_ids = hit_ids(responses[2 * j], None, vectors)
+            knn_ids = hit_ids(responses[2 * j + 1], None, vectors)
+            fused = rrf_fuse([bm25_ids, knn_ids], rcfg.rrf_k, rcfg.rerank_topn)
+            out.append({
+                "query_id": q["query_id"],
+                "query_vec": qvec,
+                "candidates": [d for d, _ in fused],
+                "rrf": dict(fused),
+                "bm25_ids": bm25_ids,
+                "knn_ids": knn_ids,
+                "vectors": vectors,
+            })
+    return out
+
+
+def features(c: dict, rrf_k: int) -> np.ndarray:
+    return candidate_features(c["query_vec"], c["candidates"], c["vectors"], c["bm25_ids"], c["knn_ids"], c["rrf"], rrf_k)
+
+
+def blend_run(cands: list, rrf_k: int, weights: np.ndarray) -> tuple:
+    run, ms = {}, []
+    for c in cands:
+        t = time.perf_counter()
+        ranked = rerank_embedding(c["query_vec"], c["candidates"], c["vectors"], c["bm25_ids"], c["knn_ids"],
+                                  c["rrf"], rrf_k, weights)
+        ms.append((time.perf_counter() - t) * 1000)
+        run[c["query_id"]] = [d for d, _ in ranked]
+    return run, float(np.mean(ms)) if ms else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the RERANK_MODE=embedding linear blend on qrels")
+    parser.add_argument("--test-frac", type=float, default=0.3, help="Held-out share of queries for evaluation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--msearch-window", type=int, default=32)
+    parser.add_argument("--out", default="", help="Weights JSON (default: <report dir>/embedding_reranker.json)")
+    args = parser.parse_args()
+
+    rcfg = get_retrieval_config()
+    data_dir = get_data_dir()
+    qrels = load_qrels(data_dir)
+    queries = [q for q in read_jsonl(data_dir / "queries.jsonl") if q["query_id"] in qrels.qrels]
+    cands = collect(get_client(), get_config().index_name, rcfg, queries, args.msearch_window)
+
+    random.Random(args.seed).shuffle(cands)
+    n_test = int(len(cands) * args.test_frac) if len(cands) > 1 else 0
+    test, train = cands[:n_test], cands[n_test:]
+
+    X = np.concatenate([features(c, rcfg.rrf_k) for c in train]) if train else np.zeros((0, len(FEATURES)))
+    y = np.asarray([qrels.qrels[c["query_id"]].get(d, 0) > 0 for c in train for d in c["candidates"]])
+    if len(set(y.tolist())) < 2:
+        print("Need both relevant and non-relevant candidates in the training queries to fit a blend.")
+        sys.exit(1)
+    model = LogisticRegression(class_weight="balanced", max_iter=1000).fit(X, y)
+    fitted = model.coef_[0].astype(np.float32)
+    default = np.asarray([DEFAULT_WEIGHTS[f] for f in FEATURES], dtype=np.float32)
+
+    evaluated = test or train
+    runs = {"hybrid_rrf": {c["query_id"]: c["candidates"] for c in evaluated}}
+    runs["embed_default"], default_ms = blend_run(evaluated, rcfg.rrf_k, default)
+    runs["embed_fitted"], fitted_ms = blend_run(evaluated, rcfg.rrf_k, fitted)
+    means = {name: s.means() for name, s in evaluate_runs(runs, qrels).items()}
+
+    report = {
+        "weights": {f: float(w) for f, w in zip(FEATURES, fitted)},
+        "features": list(FEATURES),
+        "rrf_k": rcfg.rrf_k,
+        "rerank_topn": rcfg.rerank_topn,
+        "train_queries": len(train),
+        "eval_queries": len(evaluated),
+        "eval_split": "held-out" if test else "train (too few queries to hold out)",
+        "eval": {name: {m: means[name][m] for m in ("ndcg@10", "mrr@10")} for name in runs},
+        "rerank_ms_per_query": {"embed_default": default_ms, "embed_fitted": fitted_ms},
+    }
+    out = Path(args.out) if args.out else get_report_dir(data_dir) / "embedding_reranker.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(json.dumps(report, indent=2))
+    print(f"Wrote {out}. Use it with RERANK_MODE=embedding RERANK_EMBED_WEIGHTS={out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import argparse
+import itertools
+import random
+import sys
+import threading
+import time
+import warnings
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+warnings.filterwarnings("ignore")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import pandas as pd
+
+from src.histogram import Histogram
+from src.utils import get_data_dir, get_report_dir, read_jsonl, write_json, write_text
+
+PERCENTILES = (50, 95, 99, 99.9)
+
+
+class Recorder:
+    """Per-stage histograms plus error counts, shared by all worker threads.
+
+    `sent` counts requests started in the measured window; `ok_on_time` the successes that also
+    finished inside it, which is what achieved throughput counts (late ones still get latencies).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hists = {"client_ms": Histogram()}
+        self.sent = 0
+        self.ok = 0
+        self.ok_on_time = 0
+        self.errors = Counter()
+
+    def send(self) -> None:
+        with self._lock:
+            self.sent += 1
+
+    def success(self, client_ms: float, timings: dict, on_time: bool) -> None:
+        with self._lock:
+            self.ok += 1
+            self.ok_on_time += on_time
+            self.hists["client_ms"].record(client_ms)
+            for k, v in timings.items():
+                if k.endswith("_ms") and isinstance(v, (int, float)):
+                    self.hists.setdefault(k, Histogram()).record(v)
+
+    def failure(self, e: Exception) -> None:
+        with self._lock:
+            self.errors[type(e).__name__] += 1
+
+
+def http_target(url: str, pool: int, timeout: float):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool))
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool))
+
+    def call(query: str) -> dict:
+        r = session.post(url, json={"query": query, "size": 10}, timeout=timeout)
+        r.raise_for_status()
+        return r.json()["timings"]
+
+    return call
+
+
+def inproc_target():
+    """The pipeline in this process: no HTTP in the way, same stages as search_server.py."""
+    from src.config import get_retrieval_config
+    from src.embed import embed_texts
+    from src.es_client import get_client, get_config
+    from src.pipeline import process_query
+    from src.rerank import warm_up
+
+    es, index, rcfg = get_client(), get_config().index_name, get_retrieval_config()
+    embed_texts(["warm up"])
+    warm_up()
+
+    def call(query: str) -> dict:
+        return process_query(es, index, rcfg, {"query_id": "load", "query": query})["latency"]
+
+    return call
+
+
+def run_closed(call, queries: list, concurrency: int, duration: float, warmup: float, rec: Recorder) -> float:
+    """`concurrency` workers each send the next query as soon as their previous one returns.
+    Returns the seconds from the start of measurement until the last request returned."""
+    seq = itertools.count()
+    start = time.perf_counter()
+    measure_from, end = start + warmup, start + warmup + duration
+
+    def worker():
+        while True:
+            t0 = time.perf_counter()
+            if t0 >= end:
+                return
+            query = queries[next(seq) % len(queries)]
+            if t0 >= measure_from:
+                rec.send()
+            try:
+                timings = call(query)
+            except Exception as e:
+                if t0 >= measure_from:
+                    rec.failure(e)
+                continue
+            t1 = time.perf_counter()
+            if t0 >= measure_from:
+                rec.success((t1 - t0) * 1000, timings, t1 <= end)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - measure_from
+
+
+def run_open(call, queries: list, qps: float, duration: float, warmup: float, max_outstanding: int,
+             poisson: bool, seed: int, rec: Recorder) -> float:
+    """Send on a fixed schedule regardless of responses. client_ms runs from the scheduled send
+    time, so a backed-up system is charged for the wait (no coordinated omission). Returns the
+    seconds from the start of measurement until the queue drained, which overload pushes past `end`."""
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    measure_from, end = start + warmup, start + warmup + duration
+
+    def job(t_sched: float, query: str):
+        try:
+            timings = call(query)
+        except Exception as e:
+            if t_sched >= measure_from:
+                rec.failure(e)
+            return
+        t1 = time.perf_counter()
+        if t_sched >= measure_from:
+            rec.success((t1 - t_sched) * 1000, timings, t1 <= end)
+
+    with ThreadPoolExecutor(max_workers=max_outstanding) as pool:
+        t_sched = start
+        for i in itertools.count():
+            t_sched += rng.expovariate(qps) if poisson else 1.0 / qps
+            if t_sched >= end:
+                break
+            delay = t_sched - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if t_sched >= measure_from:
+                rec.send()
+            pool.submit(job, t_sched, queries[i % len(queries)])
+    return time.perf_counter() - measure_from
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay queries.jsonl against the hybrid pipeline under load")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--qps", type=float, help="Open loop: target arrival rate")
+    mode.add_argument("--concurrency", type=int, help="Closed loop: requests in flight")
+    parser.add_argument("--url", default="", help="search_server.py /search URL; empty runs the pipeline in-process")
+    parser.add_argument("--duration", type=float, default=60.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds sent but not recorded")
+    parser.add_argument("--max-outstanding", type=int, default=64, help="Open loop: worker threads for in-flight requests")
+    parser.add_argument("--poisson", action="store_true", help="Open loop: exponential inter-arrival times")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", default="", help="Run name in the output (default: mode + rate + time)")
+    args = parser.parse_args()
+
+    data_dir = get_data_dir()
+    queries = [q["query"] for q in read_jsonl(data_dir / "queries.jsonl")]
+    random.Random(args.seed).shuffle(queries)
+    pool = args.concurrency or args.max_outstanding
+    call = http_target(args.url, pool, args.timeout) if args.url else inproc_target()
+
+    rec = Recorder()
+    if args.concurrency:
+        elapsed = run_closed(call, queries, args.concurrency, args.duration, args.warmup, rec)
+        mode_name, level = "closed", args.concurrency
+    else:
+        elapsed = run_open(call, queries, args.qps, args.duration, args.warmup, args.max_outstanding,
+                           args.poisson, args.seed, rec)
+        mode_name, level = "open", args.qps
+
+    n_err = sum(rec.errors.values())
+    total = rec.ok + n_err
+    label = args.label or f"{mode_name}_{level:g}_{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    result = {
+        "label": label,
+        "mode": mode_name,
+        "target_qps": args.qps,
+        "concurrency": args.concurrency,
+        "target": args.url or "in-process",
+        "duration_s": args.duration,
+        "elapsed_s": elapsed,
+        "requests": total,
+        # Offered: sends started in the window; achieved: successes that also finished in it
+        "offered_qps": rec.sent / args.duration if args.duration else 0.0,
+        "throughput_qps": rec.ok_on_time / args.duration if args.duration else 0.0,
+        "late": rec.ok - rec.ok_on_time,
+        "error_rate": n_err / total if total else 0.0,
+        "errors": dict(rec.errors),
+        "stages": {k: h.summary(PERCENTILES) for k, h in sorted(rec.hists.items())},
+        "histograms": {k: h.to_dict() for k, h in sorted(rec.hists.items())},
+    }
+
+    out_dir = get_report_dir(data_dir) / "load"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    write_json(out_dir / f"{label}.json", result)
+
+    client = result["stages"]["client_ms"]
+    row = {
+        "label": label, "mode": mode_name, "level": level, "offered_qps": result["offered_qps"],
+        "throughput_qps": result["throughput_qps"],
+        "error_rate": result["error_rate"], **{f"client_p{p:g}_ms": client[f"p{p:g}"] for p in PERCENTILES},
+    }
+    summary_path = out_dir / "summary.csv"
+    prev = pd.read_csv(summary_path) if summary_path.exists() else pd.DataFrame()
+    prev = prev[prev["label"] != label] if "label" in prev else prev
+    pd.concat([prev, pd.DataFrame([row])], ignore_index=True).to_csv(summary_path, index=False)
+
+    lines = [f"# Load test: {label}\n"]
+    lines.append(
+        f"{mode_name} loop, {'target ' + format(args.qps, 'g') + ' QPS' if args.qps else str(args.concurrency) + ' in flight'}, "
+        f"{args.duration:g}s measured against {result['target']}: {result['offered_qps']:.1f} QPS offered, "
+        f"{result['throughput_qps']:.1f} QPS achieved, {total} requests ({result['late']} finished after the "
+        f"window, drained at {elapsed:.0f}s), error rate {result['error_rate']:.2%}.\n"
+    )
+    lines.append("| Stage | p50 | p95 | p99 | p99.9 | Mean | Max |\n|---|---:|---:|---:|---:|---:|---:|")
+    for stage, st in result["stages"].items():
+        lines.append(
+            f"| {stage} | {st['p50']:.1f} | {st['p95']:.1f} | {st['p99']:.1f} | {st['p99.9']:.1f} "
+            f"| {st['mean']:.1f} | {st['max']:.1f} |"
+        )
+    md = "\n".join(lines) + "\n"
+    write_text(out_dir / f"{label}.md", md)
+    print(md)
+    print(f"Wrote {out_dir}/{label}.json, {label}.md, summary.csv")
+
+
+if __name__ == "__main__":
+    main()
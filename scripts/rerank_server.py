@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import warnings
+from pathlib import Path
+
+warnings.filterwarnings("ignore")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.config import get_reranker_model
+from src.microbatch import MicroBatcher
+from src.rerank import get_cross_encoder, rerank_local_cross_encoder_batch, rerank_stats
+from src.rerank_service import serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local cross-encoder service for RERANK_MODE=http with dynamic micro-batching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--max-batch", type=int, default=256, help="Max (query, doc) pairs merged into one forward pass")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="How long the first request waits for others to join")
+    args = parser.parse_args()
+
+    print(f"Loading {get_reranker_model()} ...", flush=True)
+    get_cross_encoder()
+    batcher = MicroBatcher(rerank_local_cross_encoder_batch, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    serve(batcher, args.host, args.port, stats=lambda: {**batcher.stats(), "padding": rerank_stats()})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.rerank_service import serve
+
+_TOKEN = re.compile(r"\w+")
+
+
+def overlap_score(query: str, text: str) -> float:
+    """Cheap deterministic stand-in for a cross-encoder: query-term overlap."""
+    q = set(_TOKEN.findall(query.lower()))
+    if not q:
+        return 0.0
+    d = set(_TOKEN.findall(text.lower()))
+    return len(q & d) / len(q)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub reranker speaking the RERANK_MODE=http contract (no model)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--delay-ms-per-pair", type=float, default=0.0, help="Simulated model cost per pair")
+    args = parser.parse_args()
+
+    lock = threading.Lock()
+    counters = {"requests": 0, "queries": 0, "pairs": 0}
+
+    def score_batch(items):
+        n_pairs = sum(len(docs) for _, docs in items)
+        if args.delay_ms_per_pair:
+            time.sleep(n_pairs * args.delay_ms_per_pair / 1000)
+        with lock:
+            counters["requests"] += 1
+            counters["queries"] += len(items)
+            counters["pairs"] += n_pairs
+        return [
+            sorted(((doc_id, overlap_score(query, text)) for doc_id, text in docs), key=lambda x: x[1], reverse=True)
+            for query, docs in items
+        ]
+
+    serve(score_batch, args.host, args.port, stats=lambda: dict(counters))
+
+
+if __name__ == "__main__":
+    main()
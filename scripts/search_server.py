@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import warnings
+from pathlib import Path
+
+warnings.filterwarnings("ignore")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.config import get_retrieval_config
+from src.embed import embed_texts
+from src.es_client import get_client, get_config
+from src.rerank import warm_up
+from src.search_service import serve
+from src.tracing import configure, get_trace_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hybrid BM25 + kNN + RRF + rerank behind a /search endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--max-inflight",
+        type=int,
+        default=8,
+        help="Pipeline executions at once; further requests wait (reported as queue_ms)",
+    )
+    args = parser.parse_args()
+
+    cfg = get_config()
+    es = get_client()
+    print(f"ES {cfg.url} index={cfg.index_name}; loading models ...", flush=True)
+    embed_texts(["warm up"])
+    warm_up()
+    configure(get_trace_path())  # TRACE_PATH: spans per request; percentiles under /stats "trace"
+    serve(es, cfg.index_name, get_retrieval_config(), args.host, args.port, args.max_inflight)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import sys
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+
+warnings.filterwarnings("ignore")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from src.checkpoint import CheckpointLog, iter_records
+from src.cascade import simulate
+from src.config import (
+    get_cascade_config,
+    get_embedding_model,
+    get_rerank_max_length,
+    get_rerank_mode,
+    get_reranker_model,
+    get_retrieval_config,
+)
+from src.embed import embed_texts
+from src.es_client import get_client, get_config
+from src.fusion import encode_ranked_lists, rrf_fuse_batch
+from src.metrics import encode_qrels, load_qrels, score_encoded
+from src.rerank import rerank_batch, warm_up
+from src.search import MSEARCH_FILTER_PATH, attribute_ms, bm25_body, hit_ids, hit_scores, knn_body
+from src.utils import batched, get_data_dir, get_report_dir, read_jsonl, timed, write_json, write_text
+
+METRICS = ["ndcg@10", "mrr@10", "recall@50"]
+
+
+def int_list(value: str) -> list:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def collect_params(index: str, depth: int, knn_candidates: int) -> dict:
+    """What the stored candidates depend on; kept next to candidates.jsonl to catch stale reuse."""
+    return {
+        "index": index,
+        "depth": depth,
+        "knn_candidates": max(knn_candidates, depth),
+        "embedding_model": get_embedding_model(),
+        "rerank_mode": get_rerank_mode(),
+        "reranker_model": get_reranker_model(),
+        "rerank_max_length": get_rerank_max_length(),
+    }
+
+
+def collect(es, index: str, queries: list, depth: int, knn_candidates: int, window: int, out_path: Path) -> None:
+    """Retrieve deep BM25/kNN lists with scores and cross-encoder scores for every candidate, once.
+
+    Appends one record per query to a checkpoint log, so an interrupted collection resumes.
+    """
+    n_done = sum(1 for _ in iter_records(out_path))
+    remaining = queries[n_done:]
+    if not remaining:
+        return
+    warm_up()
+    with CheckpointLog(out_path) as log, tqdm(total=len(queries), initial=n_done, desc="Collecting") as bar:
+        for chunk in batched(remaining, window):
+            texts = [q["query"] for q in chunk]
+            vecs = embed_texts(texts)
+            searches = []
+            for qtext, qvec in zip(texts, vecs):
+                searches += [{"index": index}, bm25_body(qtext, depth, True)]
+                searches += [{"index": index}, knn_body(qvec, depth, max(knn_candidates, depth), True)]
+            resp, batch_ms = timed(es.msearch, searches=searches, filter_path=MSEARCH_FILTER_PATH)
+            responses = resp["responses"]
+            for r in responses:
+                if "error" in r:
+                    raise RuntimeError(f"_msearch sub-request failed: {r['error']}")
+            shares = attribute_ms(batch_ms, [r.get("took", 0) for r in responses])
+
+            items = []
+            for j, qtext in enumerate(texts):
+                doc_texts = {}
+                hit_ids(responses[2 * j], doc_texts)
+                hit_ids(responses[2 * j + 1], doc_texts)
+                items.append((qtext, list(doc_texts.items())))
+            reranked, rerank_ms = timed(rerank_batch, items)
+            n_pairs = sum(len(docs) for _, docs in items)
+
+            for j, q in enumerate(chunk):
+                log.append({
+                    "query_id": q["query_id"],
+                    "bm25": hit_scores(responses[2 * j]),
+                    "knn": hit_scores(responses[2 * j + 1]),
+                    "rerank": dict(reranked[j]),
+                    "bm25_ms": shares[2 * j],
+                    "knn_ms": shares[2 * j + 1],
+                    "rerank_ms_per_pair": rerank_ms / n_pairs if n_pairs else 0.0,
+                })
+            bar.update(len(chunk))
+
+
+def load_candidates(path: Path, qrels) -> dict:
+    """Encode stored candidates once into the arrays every grid point works on."""
+    records = list(iter_records(path))
+    per_query = [[[d for d, _ in r["bm25"]], [d for d, _ in r["knn"]]] for r in records]
+    ids, vocab = encode_ranked_lists(per_query)
+
+    # Rerank scores as a sorted (query * vocab + doc) -> score table
+    vocab_index = {d: i for i, d in enumerate(vocab)}
+    n_docs = max(len(vocab), 1)
+    keys, vals = [], []
+    for qi, r in enumerate(records):
+        for d, s in r["rerank"].items():
+            keys.append(qi * n_docs + vocab_index[d])
+            vals.append(s)
+    keys = np.asarray(keys, dtype=np.int64)
+    order = np.argsort(keys)
+
+    enc = encode_qrels(qrels)
+    to_qrels_doc = np.asarray([enc.doc_index.get(d, -1) for d in vocab] + [-1], dtype=np.int64)
+    return {
+        "ids": ids,
+        "n_docs": n_docs,
+        "rerank_keys": keys[order],
+        "rerank_vals": np.asarray(vals, dtype=np.float64)[order],
+        "query_ids": [r["query_id"] for r in records],
+        "rows": np.asarray([enc.qid_index.get(r["query_id"], -1) for r in records], dtype=np.int64),
+        "to_qrels_doc": to_qrels_doc,
+        "enc": enc,
+        "retrieval_ms": float(np.mean([r["bm25_ms"] + r["knn_ms"] for r in records])) if records else 0.0,
+        "ms_per_pair": float(np.mean([r["rerank_ms_per_pair"] for r in records])) if records else 0.0,
+    }
+
+
+_STATE: dict = {}
+
+
+def _init_worker(state: dict) -> None:
+    _STATE.update(state)
+
+
+def rerank_scores(st: dict, head: np.ndarray) -> np.ndarray:
+    """Stored cross-encoder scores for a (queries x depth) id matrix; -inf where unknown or padding."""
+    keys = st["rerank_keys"]
+    if not keys.size:
+        return np.full(head.shape, -np.inf)
+    cand = np.arange(head.shape[0])[:, None] * st["n_docs"] + head
+    pos = np.clip(np.searchsorted(keys, cand), 0, keys.size - 1)
+    found = (head >= 0) & (keys[pos] == cand)
+    return np.where(found, st["rerank_vals"][pos], -np.inf)
+
+
+def evaluate_point(point: tuple) -> dict:
+    rrf_k, topn, rerank_topn = point
+    st = _STATE
+    ids = st["ids"][:, :, :topn]
+    # Like fuse_stage: the fused list is cut to RERANK_TOPN and all of it is reranked
+    fused, _ = rrf_fuse_batch(ids, k=rrf_k, max_out=rerank_topn)
+    order = np.argsort(-rerank_scores(st, fused), axis=1, kind="stable")
+    ranked = np.take_along_axis(fused, order, axis=1)
+
+    docs = st["to_qrels_doc"][ranked]  # -1 (padding) maps to the trailing -1 entry
+    metrics = score_encoded(st["rows"], docs, st["enc"], cutoffs=(10, 50))
+    row = {"rrf_k": rrf_k, "topn": topn, "rerank_topn": rerank_topn}
+    for m in METRICS:
+        row[m] = float(metrics[m].mean()) if metrics[m].size else 0.0
+    row["est_latency_ms"] = st["retrieval_ms"] + rerank_topn * st["ms_per_pair"]
+    return row
+
+
+def evaluate_cascade(st: dict, rrf_k: int, topn: int, rerank_topn: int, ccfg, margins: list) -> tuple:
+    """Replay the adaptive cascade on stored scores for each margin; the full rerank is the reference.
+
+    Returns a summary frame (one row per margin, plus "full") and a per-query frame.
+    """
+    fused, fused_rrf = rrf_fuse_batch(st["ids"][:, :, :topn], k=rrf_k, max_out=rerank_topn)
+    head = fused[:, :rerank_topn]
+    ce = rerank_scores(st, head)
+    n_valid = (head >= 0).sum(axis=1)
+
+    def score(depths: np.ndarray) -> dict:
+        ranked = fused.copy()
+        for q, depth in enumerate(depths):
+            order = np.argsort(-ce[q, :depth], kind="stable")
+            ranked[q, :depth] = head[q, :depth][order]
+        return score_encoded(st["rows"], st["to_qrels_doc"][ranked], st["enc"], cutoffs=(10, 50))
+
+    full = score(n_valid)
+    summary = [{"margin": "full", **{m: float(full[m].mean()) for m in METRICS},
+                "mean_pairs": float(n_valid.mean()), "pairs_saved": 0.0}]
+    per_query = []
+    for margin in margins:
+        cfg = replace(ccfg, margin=margin)
+        sims = [simulate(ce[q, :n], fused_rrf[q, :n], cfg, rerank_topn) for q, n in enumerate(n_valid)]
+        depths = np.asarray([d for d, _ in sims], dtype=np.int64)
+        got = score(depths)
+        summary.append({
+            "margin": margin,
+            **{m: float(got[m].mean()) for m in METRICS},
+            "mean_pairs": float(depths.mean()),
+            "pairs_saved": float(1 - depths.sum() / max(n_valid.sum(), 1)),
+        })
+        for q, (depth, reason) in enumerate(sims):
+            per_query.append({
+                "query_id": st["query_ids"][q], "margin": margin, "rerank_pairs": int(depth),
+                "rerank_pairs_saved": int(n_valid[q] - depth), "cascade_stop": reason,
+                "ndcg@10": float(got["ndcg@10"][q]), "ndcg@10_full": float(full["ndcg@10"][q]),
+            })
+    return pd.DataFrame(summary), pd.DataFrame(per_query)
+
+
+def pareto(df: pd.DataFrame) -> pd.Series:
+    """True where no other point is both faster and at least as good on NDCG@10."""
+    best = -np.inf
+    flags = pd.Series(False, index=df.index)
+    for i in df.sort_values(["est_latency_ms", "ndcg@10"], ascending=[True, False]).index:
+        if df.at[i, "ndcg@10"] > best:
+            flags[i] = True
+            best = df.at[i, "ndcg@10"]
+    return flags
+
+
+def main():
+    rcfg = get_retrieval_config()
+    parser = argparse.ArgumentParser(description="Offline RRF_K / RETRIEVAL_TOPN / RERANK_TOPN sweep over stored candidates")
+    parser.add_argument("--depth", type=int, default=100, help="BM25/kNN depth retrieved once per query")
+    parser.add_argument("--rrf-k", default="10,20,40,60,100")
+    parser.add_argument("--topn", default="10,20,30,50,100")
+    parser.add_argument("--rerank-topn", default="10,20,30,50",
+                        help="Fused list depth, all of it reranked (as RERANK_TOPN in the pipeline); must be > 0")
+    parser.add_argument("--msearch-window", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument("--recollect", action="store_true", help="Discard stored candidates and query ES again")
+    parser.add_argument("--cascade-margin", default="", help="Also replay the adaptive cascade (RERANK_CASCADE_*) at these margins, at the current RRF_K / RETRIEVAL_TOPN / RERANK_TOPN")
+    args = parser.parse_args()
+
+    data_dir = get_data_dir()
+    out_dir = get_report_dir(data_dir) / "sweep"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    candidates_path = out_dir / "candidates.jsonl"
+    params_path = out_dir / "candidates.params.json"
+    if args.recollect:
+        candidates_path.unlink(missing_ok=True)
+        params_path.unlink(missing_ok=True)
+
+    index = get_config().index_name
+    params = collect_params(index, args.depth, rcfg.knn_candidates)
+    if candidates_path.exists():
+        stored = json.loads(params_path.read_text(encoding="utf-8")) if params_path.exists() else None
+        if stored != params:
+            stored = stored or {}
+            changed = ", ".join(f"{k} {stored.get(k)} -> {v}" for k, v in params.items() if stored.get(k) != v)
+            print(f"{candidates_path} was collected with different settings ({changed}). Rerun with --recollect.")
+            sys.exit(1)
+    else:
+        write_json(params_path, params)
+
+    queries = read_jsonl(data_dir / "queries.jsonl")
+    collect(get_client(), index, queries, args.depth, rcfg.knn_candidates, args.msearch_window, candidates_path)
+
+    state = load_candidates(candidates_path, load_qrels(data_dir))
+    grid = [
+        (k, topn, rt)
+        for k, topn, rt in itertools.product(int_list(args.rrf_k), int_list(args.topn), int_list(args.rerank_topn))
+        if topn <= args.depth and rt > 0
+    ]
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(state,)) as pool:
+        rows = list(tqdm(pool.map(evaluate_point, grid, chunksize=8), total=len(grid), desc="Sweeping"))
+
+    df = pd.DataFrame(rows)
+    df["pareto"] = pareto(df)
+    df = df.sort_values("ndcg@10", ascending=False)
+    df.to_csv(out_dir / "sweep.csv", index=False)
+
+    lines = ["# Parameter Sweep\n"]
+    lines.append(
+        f"{len(grid)} grid points over {len(state['rows'])} queries, candidates retrieved once at depth {args.depth}. "
+        f"Latency is estimated: measured retrieval ({state['retrieval_ms']:.1f} ms) + "
+        f"rerank_topn × {state['ms_per_pair']:.2f} ms/pair.\n"
+    )
+    lines.append("| RRF k | top-n | Rerank top-n | NDCG@10 | MRR@10 | Recall@50 | Est. latency (ms) | Pareto |\n|---:|---:|---:|---:|---:|---:|---:|:---:|")
+    for r in df.to_dict("records"):
+        lines.append(
+            f"| {r['rrf_k']} | {r['topn']} | {r['rerank_topn']} | {r['ndcg@10']:.4f} | {r['mrr@10']:.4f} "
+            f"| {r['recall@50']:.4f} | {r['est_latency_ms']:.1f} | {'✓' if r['pareto'] else ''} |"
+        )
+
+    margins = [float(v) for v in args.cascade_margin.split(",") if v.strip()]
+    if margins:
+        ccfg = get_cascade_config()
+        summary, per_query = evaluate_cascade(state, rcfg.rrf_k, min(rcfg.topn, args.depth), rcfg.rerank_topn, ccfg, margins)
+        per_query.to_csv(out_dir / "cascade_per_query.csv", index=False)
+        lines.append(
+            f"\n## Adaptive cascade (RRF k {rcfg.rrf_k}, top-n {rcfg.topn}, max depth {rcfg.rerank_topn}, "
+            f"prefix {ccfg.prefix}, step {ccfg.step}, keep {ccfg.keep}, RRF gap {ccfg.rrf_gap})\n"
+        )
+        lines.append("| Margin | NDCG@10 | MRR@10 | Recall@50 | Mean pairs | Pairs saved |\n|---:|---:|---:|---:|---:|---:|")
+        for r in summary.to_dict("records"):
+            lines.append(
+                f"| {r['margin']} | {r['ndcg@10']:.4f} | {r['mrr@10']:.4f} | {r['recall@50']:.4f} "
+                f"| {r['mean_pairs']:.1f} | {r['pairs_saved']:.1%} |"
+            )
+    write_text(out_dir / "sweep.md", "\n".join(lines) + "\n")
+    print(f"Wrote {out_dir}/sweep.csv, sweep.md" + (", cascade_per_query.csv" if margins else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,16 @@ except OSError:
     except OSError:
         plt.style.use("ggplot")
 
+STAGES = (
+    ("embed_ms", "Query embed", "#9b59b6"),
+    ("bm25_ms", "BM25", "#3498db"),
+    ("knn_ms", "kNN", "#2ecc71"),
+    ("fusion_ms", "Fusion", "#f39c12"),
+    ("fetch_ms", "Doc fetch", "#1abc9c"),
+    ("rerank_ms", "Rerank", "#e74c3c"),
+    ("other_ms", "Other", "#95a5a6"),
+)
+
 
 def main():
     data_dir = get_data_dir()
@@ -34,10 +44,12 @@ def main():
     x = range(len(df))
     width = 0.7
 
-    ax.bar(x, df["bm25_ms"], width, label="BM25", color="#3498db")
-    ax.bar(x, df["knn_ms"], width, bottom=df["bm25_ms"], label="kNN", color="#2ecc71")
-    ax.bar(x, df["fusion_ms"], width, bottom=df["bm25_ms"] + df["knn_ms"], label="Fusion", color="#f39c12")
-    ax.bar(x, df["rerank_ms"], width, bottom=df["bm25_ms"] + df["knn_ms"] + df["fusion_ms"], label="Rerank", color="#e74c3c")
+    bottom = pd.Series(0.0, index=df.index)
+    for col, label, color in STAGES:
+        if col in df:  # embed_ms / fetch_ms / other_ms are missing from runs saved before tracing
+            values = df[col].fillna(0.0).clip(lower=0.0)
+            ax.bar(x, values, width, bottom=bottom, label=label, color=color)
+            bottom += values
 
     ax.set_xlabel("Query", labelpad=8)
     ax.set_ylabel("Latency (ms)", labelpad=8)
@@ -0,0 +1,82 @@
+"""Adaptive-depth reranking: score a fused prefix, extend it only while deeper candidates still matter."""
+
+from __future__ import annotations
+
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.config import CascadeConfig
+
+Docs = List[Tuple[str, str]]
+Ranked = List[Tuple[str, float]]
+
+
+def stop_reason(
+    ce_scores: Sequence[float],
+    rrf_scores: Sequence[float],
+    depth: int,
+    max_depth: int,
+    ccfg: CascadeConfig,
+    elapsed_ms: float = 0.0,
+    step_ms: float = 0.0,
+) -> Optional[str]:
+    """Why to stop after scoring the first `depth` fused candidates, or None to score the next step.
+
+    - margin: nothing in the last `step` scored positions came within `margin` of the current
+      `keep`-th best cross-encoder score, so deeper (lower-RRF) candidates are unlikely to enter the top.
+    - rrf_gap: the next candidate's RRF score is below `rrf_gap` x the top RRF score.
+    - budget: scoring another step would exceed `budget_ms` at the pace seen so far.
+    """
+    if depth >= max_depth:
+        return "max_depth"
+    if ccfg.budget_ms > 0 and elapsed_ms + step_ms > ccfg.budget_ms:
+        return "budget"
+    if depth >= ccfg.keep:
+        kth = sorted(ce_scores[:depth], reverse=True)[ccfg.keep - 1]
+        window = ce_scores[max(0, depth - ccfg.step):depth]
+        if max(window) < kth - ccfg.margin:
+            return "margin"
+    if len(rrf_scores) > depth and rrf_scores[0] > 0 and rrf_scores[depth] < ccfg.rrf_gap * rrf_scores[0]:
+        return "rrf_gap"
+    return None
+
+
+def simulate(ce_scores: Sequence[float], rrf_scores: Sequence[float], ccfg: CascadeConfig, max_depth: int) -> Tuple[int, str]:
+    """Depth and stop reason the cascade reaches given every candidate's score up front (offline sweeps)."""
+    max_depth = min(max_depth, len(ce_scores))
+    depth = min(ccfg.prefix, max_depth)
+    while True:
+        reason = stop_reason(ce_scores, rrf_scores, depth, max_depth, ccfg)
+        if reason:
+            return depth, reason
+        depth = min(depth + ccfg.step, max_depth)
+
+
+def cascade_rerank(
+    query: str,
+    docs: Docs,
+    rrf_scores: Sequence[float],
+    ccfg: CascadeConfig,
+    score_fn: Callable[[str, Docs], Ranked],
+) -> Tuple[Ranked, Dict[str, object]]:
+    """Rerank `docs` (in fused order) step by step; unscored candidates are left out of the result."""
+    max_depth = len(docs)
+    depth = min(ccfg.prefix, max_depth)
+    scores: Dict[str, float] = {}
+    steps = 0
+    t0 = time.perf_counter()
+    prev = 0
+    while True:
+        t = time.perf_counter()
+        scores.update(score_fn(query, docs[prev:depth]))
+        step_ms = (time.perf_counter() - t) * 1000
+        steps += 1
+        ce = [scores.get(doc_id, float("-inf")) for doc_id, _ in docs[:depth]]
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        next_ms = step_ms * ccfg.step / max(depth - prev, 1)
+        reason = stop_reason(ce, rrf_scores, depth, max_depth, ccfg, elapsed_ms, next_ms)
+        if reason:
+            break
+        prev, depth = depth, min(depth + ccfg.step, max_depth)
+    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    return ranked, {"rerank_pairs": depth, "rerank_steps": steps, "cascade_stop": reason}
@@ -19,6 +19,18 @@ class RetrievalConfig:
     knn_candidates: int
     rrf_k: int
     rerank_topn: int
+    inline_text: bool = True
+
+
+@dataclass
+class CascadeConfig:
+    enabled: bool
+    prefix: int
+    step: int
+    keep: int
+    margin: float
+    rrf_gap: float
+    budget_ms: float
 
 
 def get_embed_dims() -> int:
@@ -33,10 +45,67 @@ def get_reranker_model() -> str:
     return os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
 
 
+def get_rerank_mode() -> str:
+    """local: cross-encoder in process. http: remote service. embedding: stored vectors + rank features, no model."""
+    return os.getenv("RERANK_MODE", "local").lower().strip()
+
+
+def get_rerank_batch_size() -> int:
+    return int(os.getenv("RERANK_BATCH_SIZE", "32"))
+
+
+def get_rerank_max_length() -> int:
+    return int(os.getenv("RERANK_MAX_LENGTH", "512"))
+
+
+def get_rerank_length_bucketing() -> bool:
+    """Sort cross-encoder pairs by character length (a token-length proxy) before batching so each batch pads similarly."""
+    return os.getenv("RERANK_LENGTH_BUCKETING", "true").lower().strip() in ("1", "true", "yes")
+
+
+def get_inference_backend() -> str:
+    """torch: fp32 PyTorch. int8: dynamic int8 quantization of Linear layers. onnx: ONNX Runtime."""
+    return os.getenv("INFERENCE_BACKEND", "torch").lower().strip()
+
+
+def get_onnx_model_file() -> str:
+    """Optional ONNX file inside the model repo, e.g. onnx/model_qint8_avx512_vnni.onnx."""
+    return os.getenv("ONNX_MODEL_FILE", "").strip()
+
+
+def get_es_profile_slow_ms() -> float:
+    """Searches whose server `took` reaches this are re-run with `profile: true` (0 = off)."""
+    return float(os.getenv("ES_PROFILE_SLOW_MS", "0"))
+
+
+def get_fusion_mode() -> str:
+    """client: rrf_fuse over two searches. server: one request with ES-native rank.rrf."""
+    return os.getenv("FUSION_MODE", "client").lower().strip()
+
+
 def get_retrieval_config() -> RetrievalConfig:
     return RetrievalConfig(
         topn=int(os.getenv("RETRIEVAL_TOPN", "50")),
         knn_candidates=int(os.getenv("KNN_NUM_CANDIDATES", "100")),
         rrf_k=int(os.getenv("RRF_K", "60")),
         rerank_topn=int(os.getenv("RERANK_TOPN", "50")),
+        inline_text=os.getenv("INLINE_DOC_TEXT", "true").lower().strip() in ("1", "true", "yes"),
+    )
+
+
+def get_cascade_config() -> CascadeConfig:
+    """Adaptive rerank depth: score RERANK_CASCADE_PREFIX candidates, then RERANK_CASCADE_STEP more at a time."""
+    ccfg = CascadeConfig(
+        enabled=os.getenv("RERANK_CASCADE", "false").lower().strip() in ("1", "true", "yes"),
+        prefix=int(os.getenv("RERANK_CASCADE_PREFIX", "20")),
+        step=int(os.getenv("RERANK_CASCADE_STEP", "10")),
+        keep=int(os.getenv("RERANK_CASCADE_KEEP", "10")),
+        margin=float(os.getenv("RERANK_CASCADE_MARGIN", "1.0")),
+        rrf_gap=float(os.getenv("RERANK_CASCADE_RRF_GAP", "0.3")),
+        budget_ms=float(os.getenv("RERANK_CASCADE_BUDGET_MS", "0")),
     )
+    # step < 1 would never deepen the cascade; keep < 1 would index the lowest score as the k-th best
+    for name in ("prefix", "step", "keep"):
+        if getattr(ccfg, name) < 1:
+            raise ValueError(f"RERANK_CASCADE_{name.upper()} must be >= 1, got {getattr(ccfg, name)}")
+    return ccfg
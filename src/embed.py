@@ -1,15 +1,25 @@
 from functools import lru_cache
-from typing import List
+from typing import List, Optional
 
 from src.config import get_embedding_model
+from src.inference import load_sentence_transformer
 
 
-@lru_cache(maxsize=1)
-def _get_model():
-    from sentence_transformers import SentenceTransformer
-    return SentenceTransformer(get_embedding_model())
+@lru_cache(maxsize=2)
+def _get_model(backend: Optional[str] = None):
+    return load_sentence_transformer(get_embedding_model(), backend)
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    model = _get_model()
+def embed_texts(texts: List[str], backend: Optional[str] = None) -> List[List[float]]:
+    model = _get_model(backend)
     vectors = model.encode(texts, normalize_embeddings=True).tolist()
     return vectors
+
+def embed_texts_cached(texts: List[str], cache) -> List[List[float]]:
+    """embed_texts through an EmbeddingCache: only cache misses go to the model."""
+    found, missing = cache.lookup(texts)
+    if missing:
+        new_vectors = embed_texts([texts[i] for i in missing])
+        cache.add([texts[i] for i in missing], new_vectors)
+        for i, vec in zip(missing, new_vectors):
+            found[i] = vec
+    return [v.tolist() if hasattr(v, "tolist") else v for v in found]
@@ -0,0 +1,134 @@
+"""Content-addressed embedding store: float vectors in a memory-mapped .npy, keyed by sha256 of the text."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import get_embed_dims, get_embedding_model
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[1]
+_DIGEST_SIZE = 32
+
+
+def get_embed_cache_dir() -> Path:
+    path = os.getenv("EMBED_CACHE_DIR", "").strip()
+    if path:
+        p = Path(path)
+        return (_PROJECT_ROOT / p) if not p.is_absolute() else p
+    return _PROJECT_ROOT / ".cache" / "embeddings"
+
+
+def get_embed_cache_dtype() -> str:
+    return os.getenv("EMBED_CACHE_DTYPE", "float32").strip()
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """One directory per (model, dims, dtype).
+
+    vectors.npy holds rows in insertion order and grows by doubling; keys.bin holds one
+    32-byte digest per row and is appended only after the row is flushed, so a crash
+    can lose the newest rows but never point a key at a half-written vector.
+    """
+
+    def __init__(self, root: Path, model_name: str, dims: int, dtype: str = "float32"):
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", model_name).strip("-")
+        self.dir = Path(root) / f"{slug}_{dims}d_{dtype}"
+        self.dims = dims
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors_path = self.dir / "vectors.npy"
+        self._keys_path = self.dir / "keys.bin"
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+        self._index: Dict[bytes, int] = {}
+        if self._keys_path.exists():
+            raw = self._keys_path.read_bytes()
+            n = len(raw) // _DIGEST_SIZE
+            for i in range(n):
+                self._index[raw[i * _DIGEST_SIZE:(i + 1) * _DIGEST_SIZE]] = i
+        self._count = len(self._index)
+
+        if self._vectors_path.exists():
+            self._vectors = np.load(self._vectors_path, mmap_mode="r+")
+            if self._vectors.shape[1] != dims or self._vectors.dtype != self.dtype:
+                raise ValueError(f"Embedding cache at {self.dir} has shape {self._vectors.shape}, dtype {self._vectors.dtype}")
+        else:
+            self._vectors = self._allocate(self._vectors_path, max(1024, self._count))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _allocate(self, path: Path, capacity: int) -> np.memmap:
+        return np.lib.format.open_memmap(path, mode="w+", dtype=self.dtype, shape=(capacity, self.dims))
+
+    def _reserve(self, needed: int) -> None:
+        capacity = self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        tmp = self._vectors_path.with_suffix(".npy.tmp")
+        grown = self._allocate(tmp, capacity)
+        grown[:self._count] = self._vectors[:self._count]
+        grown.flush()
+        del grown
+        del self._vectors
+        tmp.replace(self._vectors_path)
+        self._vectors = np.load(self._vectors_path, mmap_mode="r+")
+
+    def lookup(self, texts: List[str]) -> Tuple[List[Optional[np.ndarray]], List[int]]:
+        """Return per-text vectors (None on miss) and the indices of the misses."""
+        with self._lock:
+            found: List[Optional[np.ndarray]] = []
+            missing = []
+            for i, text in enumerate(texts):
+                row = self._index.get(text_key(text))
+                if row is None:
+                    found.append(None)
+                    missing.append(i)
+                else:
+                    found.append(self._vectors[row])
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            return found, missing
+
+    def add(self, texts: List[str], vectors: List[List[float]]) -> None:
+        with self._lock:
+            new_keys = []
+            new_rows = []
+            for text, vec in zip(texts, vectors):
+                key = text_key(text)
+                if key in self._index:
+                    continue
+                self._index[key] = self._count + len(new_keys)
+                new_keys.append(key)
+                new_rows.append(vec)
+            if not new_keys:
+                return
+            self._reserve(self._count + len(new_keys))
+            self._vectors[self._count:self._count + len(new_keys)] = np.asarray(new_rows, dtype=self.dtype)
+            self._vectors.flush()
+            with self._keys_path.open("ab") as f:
+                f.write(b"".join(new_keys))
+            self._count += len(new_keys)
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    from src.inference import resolve_backend
+    backend = resolve_backend()
+    # Quantized backends produce slightly different vectors, so they get their own cache
+    model_key = get_embedding_model() if backend == "torch" else f"{get_embedding_model()}@{backend}"
+    return EmbeddingCache(get_embed_cache_dir(), model_key, get_embed_dims(), get_embed_cache_dtype())
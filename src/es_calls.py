@@ -0,0 +1,189 @@
+"""Per-call Elasticsearch accounting: server `took`, transport round trip, request/response bytes and
+client JSON encode/decode time, so a slow stage can be split into cluster vs network vs Python.
+
+The client is built with the serializers below; they only measure while a call started by call_es()
+is in progress, and call_es() only records inside `with collect(query_id)`.
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from elasticsearch.serializer import (
+    CompatibilityModeJsonSerializer,
+    CompatibilityModeNdjsonSerializer,
+    JsonSerializer,
+    NdjsonSerializer,
+)
+
+from src.config import get_es_profile_slow_ms
+
+FIELDS = (
+    "query_id", "op", "status", "took_ms", "transport_ms", "network_ms", "wall_ms", "encode_ms", "decode_ms",
+    "client_ms", "request_bytes", "response_bytes", "hits",
+)
+
+_current: ContextVar[Optional["ESCall"]] = ContextVar("es_call", default=None)
+_collector: ContextVar[Optional["CallLog"]] = ContextVar("es_call_log", default=None)
+
+
+class ESCall:
+    __slots__ = ("op", "encode_ns", "decode_ns", "request_bytes", "response_bytes")
+
+    def __init__(self, op: str):
+        self.op = op
+        self.encode_ns = self.decode_ns = 0
+        self.request_bytes = self.response_bytes = 0
+
+
+class _Measured:
+    """Mixin for the elasticsearch serializers: time dumps/loads and count bytes for the current call."""
+
+    def dumps(self, data: Any) -> bytes:
+        call = _current.get()
+        if call is None:
+            return super().dumps(data)
+        t0 = time.perf_counter_ns()
+        out = super().dumps(data)
+        call.encode_ns += time.perf_counter_ns() - t0
+        call.request_bytes += len(out)
+        return out
+
+    def loads(self, data: bytes) -> Any:
+        call = _current.get()
+        if call is None:
+            return super().loads(data)
+        t0 = time.perf_counter_ns()
+        out = super().loads(data)
+        call.decode_ns += time.perf_counter_ns() - t0
+        call.response_bytes += len(data)
+        return out
+
+
+class MeasuredJsonSerializer(_Measured, JsonSerializer):
+    pass
+
+
+class MeasuredCompatJsonSerializer(_Measured, CompatibilityModeJsonSerializer):
+    pass
+
+
+class MeasuredNdjsonSerializer(_Measured, NdjsonSerializer):
+    pass
+
+
+class MeasuredCompatNdjsonSerializer(_Measured, CompatibilityModeNdjsonSerializer):
+    pass
+
+
+def measured_serializers() -> Dict[str, Any]:
+    """`serializers=` for Elasticsearch/AsyncElasticsearch (ES 8 answers in the compatibility mimetypes)."""
+    return {
+        s.mimetype: s
+        for s in (MeasuredJsonSerializer(), MeasuredCompatJsonSerializer(),
+                  MeasuredNdjsonSerializer(), MeasuredCompatNdjsonSerializer())
+    }
+
+
+class CallLog:
+    """Rows for every ES call made inside one collect() block, plus slow searches to profile afterwards."""
+
+    def __init__(self, query_id: str):
+        self.query_id = query_id
+        self.rows: List[dict] = []
+        self.slow: List[tuple] = []
+        self.slow_ms = get_es_profile_slow_ms()
+
+    def add(self, call: ESCall, resp, wall_ns: int, method, kwargs: dict) -> None:
+        body = getattr(resp, "body", resp) or {}
+        meta = getattr(resp, "meta", None)
+        took = body.get("took")
+        transport_ms = meta.duration * 1000 if meta is not None else None
+        wall_ms = wall_ns / 1e6
+        encode_ms, decode_ms = call.encode_ns / 1e6, call.decode_ns / 1e6
+        hits = body.get("hits", {}).get("hits") if "hits" in body else body.get("docs", body.get("responses"))
+        self.rows.append({
+            "query_id": self.query_id,
+            "op": call.op,
+            "status": meta.status if meta is not None else None,
+            "took_ms": took,
+            "transport_ms": transport_ms,
+            "network_ms": transport_ms - took if transport_ms is not None and took is not None else None,
+            "wall_ms": wall_ms,
+            "encode_ms": encode_ms,
+            "decode_ms": decode_ms,
+            "client_ms": wall_ms - transport_ms - decode_ms - encode_ms if transport_ms is not None else None,
+            "request_bytes": call.request_bytes,
+            "response_bytes": call.response_bytes,
+            "hits": len(hits) if hits is not None else 0,
+        })
+        if self.slow_ms > 0 and took is not None and took >= self.slow_ms and getattr(method, "__name__", "") == "search":
+            self.slow.append((call.op, took, method, kwargs))
+
+
+@contextmanager
+def collect(query_id: str):
+    log = CallLog(query_id)
+    token = _collector.set(log)
+    try:
+        yield log
+    finally:
+        _collector.reset(token)
+
+
+def call_es(op: str, method, **kwargs):
+    """method(**kwargs), recorded into the active CallLog (a plain call when none is active)."""
+    log = _collector.get()
+    if log is None:
+        return method(**kwargs)
+    call = ESCall(op)
+    token = _current.set(call)
+    t0 = time.perf_counter_ns()
+    try:
+        resp = method(**kwargs)
+    finally:
+        _current.reset(token)
+    log.add(call, resp, time.perf_counter_ns() - t0, method, kwargs)
+    return resp
+
+
+async def acall_es(op: str, method, **kwargs):
+    log = _collector.get()
+    if log is None:
+        return await method(**kwargs)
+    call = ESCall(op)
+    token = _current.set(call)
+    t0 = time.perf_counter_ns()
+    try:
+        resp = await method(**kwargs)
+    finally:
+        _current.reset(token)
+    log.add(call, resp, time.perf_counter_ns() - t0, method, kwargs)
+    return resp
+
+
+def _profile_kwargs(kwargs: dict) -> dict:
+    return {**kwargs, "profile": True, "filter_path": list(kwargs.get("filter_path") or ["took"]) + ["profile"]}
+
+
+def _profile_row(log: CallLog, op: str, took, resp) -> dict:
+    return {"query_id": log.query_id, "op": op, "took_ms": took, "profile": (getattr(resp, "body", resp) or {}).get("profile")}
+
+
+def profile_slow(log: CallLog) -> List[dict]:
+    """Re-run searches slower than ES_PROFILE_SLOW_MS with `profile: true`. Call outside the timed stages."""
+    return [_profile_row(log, op, took, method(**_profile_kwargs(kw))) for op, took, method, kw in log.slow]
+
+
+async def aprofile_slow(log: CallLog) -> List[dict]:
+    return [_profile_row(log, op, took, await method(**_profile_kwargs(kw))) for op, took, method, kw in log.slow]
+
+
+def attach(record: dict, log: CallLog, profiles: List[dict]) -> dict:
+    record["es_calls"] = log.rows
+    if profiles:
+        record["es_profiles"] = profiles
+    return record
@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Dict, Optional
 from dotenv import load_dotenv
 from elasticsearch import Elasticsearch
 
@@ -11,15 +11,42 @@ class ESConfig:
     url: str
     api_key: Optional[str]
     index_name: str
+    connections_per_node: int = 10
+    request_timeout: float = 30.0
 
 def get_config() -> ESConfig:
     url = os.getenv("ES_URL", "http://localhost:9200")
     api_key = os.getenv("ES_API_KEY") or None
     index_name = os.getenv("INDEX_NAME", "blogathon-rrf-demo")
-    return ESConfig(url=url, api_key=api_key, index_name=index_name)
+    connections_per_node = int(os.getenv("ES_CONNECTIONS_PER_NODE", "10"))
+    request_timeout = float(os.getenv("ES_REQUEST_TIMEOUT", "30"))
+    return ESConfig(
+        url=url,
+        api_key=api_key,
+        index_name=index_name,
+        connections_per_node=connections_per_node,
+        request_timeout=request_timeout,
+    )
+
+def _client_kwargs(cfg: ESConfig) -> Dict[str, Any]:
+    # Connections in the pool are kept alive and reused across requests.
+    # The serializers time JSON encode/decode and count bytes for src.es_calls.
+    from src.es_calls import measured_serializers
+    kwargs: Dict[str, Any] = {
+        "connections_per_node": cfg.connections_per_node,
+        "request_timeout": cfg.request_timeout,
+        "serializers": measured_serializers(),
+    }
+    if cfg.api_key:
+        kwargs["api_key"] = cfg.api_key
+    return kwargs
 
 def get_client() -> Elasticsearch:
     cfg = get_config()
-    if cfg.api_key:
-        return Elasticsearch(cfg.url, api_key=cfg.api_key)
-    return Elasticsearch(cfg.url)
+    return Elasticsearch(cfg.url, **_client_kwargs(cfg))
+
+def get_async_client():
+    """AsyncElasticsearch with the same pooled, keep-alive settings (requires aiohttp)."""
+    from elasticsearch import AsyncElasticsearch
+    cfg = get_config()
+    return AsyncElasticsearch(cfg.url, **_client_kwargs(cfg))
@@ -1,15 +1,148 @@
 from __future__ import annotations
-from typing import Dict, List, Tuple
+import heapq
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 def rrf_fuse(
     ranked_lists: List[List[str]],
     k: int = 60,
-    max_out: int = 100
+    max_out: int = 100,
+    weights: Optional[Sequence[float]] = None,
 ) -> List[Tuple[str, float]]:
+    """Weighted N-way RRF; ties keep first-seen order, like a stable full sort."""
+    weights = weights or [1.0] * len(ranked_lists)
     scores: Dict[str, float] = {}
-    for lst in ranked_lists:
+    for lst, w in zip(ranked_lists, weights):
         for i, doc_id in enumerate(lst, start=1):
-            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + i)
+            scores[doc_id] = scores.get(doc_id, 0.0) + w / (k + i)
+
+    return heapq.nlargest(max_out, scores.items(), key=lambda x: x[1])
+
+def _normalize(scored: List[Tuple[str, float]], norm: str) -> List[Tuple[str, float]]:
+    if norm == "none" or not scored:
+        return scored
+    vals = [s for _, s in scored]
+    lo, hi = min(vals), max(vals)
+    if norm == "minmax":
+        span = hi - lo
+        return [(d, (s - lo) / span if span > 0 else 1.0) for d, s in scored]
+    if norm == "max":
+        return [(d, s / hi if hi > 0 else 0.0) for d, s in scored]
+    raise ValueError(f"Unknown norm: {norm}")
+
+def score_fuse(
+    scored_lists: List[List[Tuple[str, float]]],
+    method: str = "combsum",
+    max_out: int = 100,
+    weights: Optional[Sequence[float]] = None,
+    norm: str = "minmax",
+) -> List[Tuple[str, float]]:
+    """Score-based fusion over (doc_id, score) lists.
+
+    combsum: sum of normalized scores. combmnz: combsum times the number of lists that
+    returned the doc. convex: weighted sum of normalized scores with weights summing to 1.
+    """
+    weights = list(weights or [1.0] * len(scored_lists))
+    if method == "convex":
+        total_w = sum(weights)
+        weights = [w / total_w for w in weights]
+    scores: Dict[str, float] = {}
+    hits: Dict[str, int] = {}
+    for lst, w in zip(scored_lists, weights):
+        for doc_id, s in _normalize(lst, norm):
+            scores[doc_id] = scores.get(doc_id, 0.0) + w * s
+            hits[doc_id] = hits.get(doc_id, 0) + 1
+    if method == "combmnz":
+        scores = {d: s * hits[d] for d, s in scores.items()}
+    elif method not in ("combsum", "convex"):
+        raise ValueError(f"Unknown fusion method: {method}")
+    return heapq.nlargest(max_out, scores.items(), key=lambda x: x[1])
+
+# Batch fusion over integer-encoded doc ids: arrays are (lists, queries, depth), -1 = padding.
+
+def encode_ranked_lists(per_query: List[List[List[str]]]) -> Tuple[np.ndarray, List[str]]:
+    """[[list_1, list_2, ...] per query] -> (lists x queries x depth) int array and id vocabulary."""
+    n_q = len(per_query)
+    n_lists = max((len(lists) for lists in per_query), default=0)
+    depth = max((len(lst) for lists in per_query for lst in lists), default=0)
+    vocab: Dict[str, int] = {}
+    out = np.full((n_lists, n_q, depth), -1, dtype=np.int64)
+    for q, lists in enumerate(per_query):
+        for li, lst in enumerate(lists):
+            out[li, q, :len(lst)] = [vocab.setdefault(d, len(vocab)) for d in lst]
+    return out, list(vocab)
+
+def decode_ids(ids: np.ndarray, vocab: List[str]) -> List[List[str]]:
+    return [[vocab[i] for i in row if i >= 0] for row in ids]
+
+def _fuse_batch(ids: np.ndarray, contrib: np.ndarray, max_out: int, mnz: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    n_lists, n_q, depth = ids.shape
+    out_ids = np.full((n_q, max_out), -1, dtype=np.int64)
+    out_scores = np.zeros((n_q, max_out))
+    # (queries, lists, depth) order so a doc's first flat position is its first-seen position
+    ids_q = ids.transpose(1, 0, 2).reshape(n_q, -1)
+    contrib_q = contrib.transpose(1, 0, 2).reshape(n_q, -1)
+    valid = ids_q >= 0
+    if not valid.any():
+        return out_ids, out_scores
+    n_docs = int(ids_q.max()) + 1
+    rows = np.broadcast_to(np.arange(n_q)[:, None], ids_q.shape)[valid]
+    keys = rows * n_docs + ids_q[valid]
+    uniq, first, inv = np.unique(keys, return_index=True, return_inverse=True)
+    totals = np.bincount(inv, weights=contrib_q[valid], minlength=uniq.size)
+    if mnz:
+        totals *= np.bincount(inv, minlength=uniq.size)
+
+    u_rows = uniq // n_docs
+    order = np.lexsort((first, -totals, u_rows))
+    s_rows = u_rows[order]
+    rank = np.arange(order.size) - np.searchsorted(s_rows, s_rows, side="left")
+    keep = rank < max_out
+    sel = order[keep]
+    out_ids[s_rows[keep], rank[keep]] = uniq[sel] % n_docs
+    out_scores[s_rows[keep], rank[keep]] = totals[sel]
+    return out_ids, out_scores
+
+def rrf_fuse_batch(
+    ids: np.ndarray,
+    k: int = 60,
+    max_out: int = 100,
+    weights: Optional[Sequence[float]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """rrf_fuse for many queries at once; returns (queries x max_out) ids (-1 pad) and scores."""
+    n_lists, _, depth = ids.shape
+    w = np.asarray(weights if weights is not None else [1.0] * n_lists, dtype=np.float64)
+    contrib = w[:, None, None] / (k + np.arange(1, depth + 1))[None, None, :]
+    contrib = np.broadcast_to(contrib, ids.shape)
+    return _fuse_batch(ids, contrib, max_out)
 
-    fused = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-    return fused[:max_out]
+def score_fuse_batch(
+    ids: np.ndarray,
+    scores: np.ndarray,
+    method: str = "combsum",
+    max_out: int = 100,
+    weights: Optional[Sequence[float]] = None,
+    norm: str = "minmax",
+) -> Tuple[np.ndarray, np.ndarray]:
+    """score_fuse for many queries at once; scores align with ids (lists x queries x depth)."""
+    n_lists = ids.shape[0]
+    valid = ids >= 0
+    s = np.where(valid, scores, np.nan).astype(np.float64)
+    if norm == "minmax":
+        lo = np.nanmin(np.where(valid, s, np.inf), axis=2, keepdims=True)
+        hi = np.nanmax(np.where(valid, s, -np.inf), axis=2, keepdims=True)
+        span = hi - lo
+        s = np.where(span > 0, (s - lo) / np.where(span > 0, span, 1.0), 1.0)
+    elif norm == "max":
+        hi = np.nanmax(np.where(valid, s, -np.inf), axis=2, keepdims=True)
+        s = np.where(hi > 0, s / np.where(hi > 0, hi, 1.0), 0.0)
+    elif norm != "none":
+        raise ValueError(f"Unknown norm: {norm}")
+    w = np.asarray(weights if weights is not None else [1.0] * n_lists, dtype=np.float64)
+    if method == "convex":
+        w = w / w.sum()
+    elif method not in ("combsum", "combmnz"):
+        raise ValueError(f"Unknown fusion method: {method}")
+    contrib = np.where(valid, s * w[:, None, None], 0.0)
+    return _fuse_batch(ids, contrib, max_out, mnz=method == "combmnz")
@@ -0,0 +1,110 @@
+"""Mergeable log-bucketed latency histogram (fixed relative error, constant memory)."""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, Iterable
+
+
+class Histogram:
+    """Values go into geometric buckets of width `precision` (1% by default), so any quantile is
+    reported within that relative error however many samples are recorded. Histograms with the
+    same precision merge by adding bucket counts, across threads, processes or runs.
+    """
+
+    def __init__(self, precision: float = 0.01, min_value: float = 1e-3):
+        self.precision = precision
+        self.min_value = min_value
+        self._log_base = math.log1p(precision)
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _bucket(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return int(math.log(value / self.min_value) / self._log_base) + 1
+
+    def _bucket_value(self, idx: int) -> float:
+        """Geometric midpoint of bucket `idx`."""
+        if idx == 0:
+            return self.min_value
+        lo = self.min_value * math.exp((idx - 1) * self._log_base)
+        return lo * math.sqrt(1 + self.precision)
+
+    def record(self, value: float, n: int = 1) -> None:
+        b = self._bucket(value)
+        self.counts[b] = self.counts.get(b, 0) + n
+        self.count += n
+        self.total += value * n
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def record_many(self, values: Iterable[float]) -> None:
+        for v in values:
+            self.record(v)
+
+    def merge(self, other: "Histogram") -> "Histogram":
+        if (other.precision, other.min_value) != (self.precision, self.min_value):
+            raise ValueError("Histograms with different precision/min_value cannot be merged")
+        for b, c in other.counts.items():
+            self.counts[b] = self.counts.get(b, 0) + c
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, p: float) -> float:
+        """Value at percentile p (0-100); clamped to the exact min/max seen."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for b in sorted(self.counts):
+            seen += self.counts[b]
+            if seen >= rank:
+                return min(max(self._bucket_value(b), self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self, percentiles: Iterable[float] = (50, 95, 99, 99.9)) -> Dict[str, float]:
+        out = {"count": self.count, "mean": self.mean, "min": self.min if self.count else 0.0,
+               "max": self.max if self.count else 0.0}
+        for p in percentiles:
+            out[f"p{p:g}"] = self.percentile(p)
+        return out
+
+    def to_dict(self) -> dict:
+        return {
+            "precision": self.precision,
+            "min_value": self.min_value,
+            "count": self.count,
+            "total": self.total,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "counts": {str(b): c for b, c in sorted(self.counts.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Histogram":
+        h = cls(data["precision"], data["min_value"])
+        h.counts = {int(b): c for b, c in data["counts"].items()}
+        h.count = data["count"]
+        h.total = data["total"]
+        h.min = data["min"] if data["min"] is not None else math.inf
+        h.max = data["max"] if data["max"] is not None else -math.inf
+        return h
+
+
+def merge_all(histograms: Iterable[Histogram]) -> Histogram:
+    hs = list(histograms)
+    out = Histogram(hs[0].precision, hs[0].min_value) if hs else Histogram()
+    for h in hs:
+        out.merge(h)
+    return out
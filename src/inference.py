@@ -0,0 +1,63 @@
+"""Model loading per INFERENCE_BACKEND (torch | int8 | onnx) for the bi-encoder and cross-encoder."""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from src.config import get_inference_backend, get_onnx_model_file
+
+BACKENDS = ("torch", "int8", "onnx")
+
+
+def resolve_backend(backend: Optional[str] = None) -> str:
+    backend = (backend or get_inference_backend()).lower().strip()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND {backend!r}, expected one of {BACKENDS}")
+    return backend
+
+
+def _quantize_int8(module):
+    """Dynamic int8 quantization: Linear weights stored as int8, activations quantized per batch."""
+    import torch
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _require_onnx(cls, min_version: tuple) -> None:
+    """backend="onnx" came to SentenceTransformer in sentence-transformers 3.2 and to CrossEncoder in 4.1."""
+    import sentence_transformers
+    version = sentence_transformers.__version__
+    if tuple(int(p) for p in version.split(".")[:2] if p.isdigit()) < min_version:
+        need = ".".join(map(str, min_version))
+        raise RuntimeError(
+            f"INFERENCE_BACKEND=onnx needs sentence-transformers>={need} for {cls.__name__} (installed: {version}); "
+            f"pip install 'sentence-transformers[onnx]>={need}'"
+        )
+
+
+def _onnx_kwargs() -> dict:
+    file_name = get_onnx_model_file()
+    return {"backend": "onnx", "model_kwargs": {"file_name": file_name} if file_name else {}}
+
+
+def load_sentence_transformer(model_name: str, backend: Optional[str] = None):
+    from sentence_transformers import SentenceTransformer
+    backend = resolve_backend(backend)
+    if backend == "onnx":
+        _require_onnx(SentenceTransformer, (3, 2))
+        return SentenceTransformer(model_name, device="cpu", **_onnx_kwargs())
+    if backend == "int8":
+        return _quantize_int8(SentenceTransformer(model_name, device="cpu"))
+    return SentenceTransformer(model_name)
+
+
+def load_cross_encoder(model_name: str, max_length: int, backend: Optional[str] = None):
+    from sentence_transformers import CrossEncoder
+    backend = resolve_backend(backend)
+    if backend == "onnx":
+        _require_onnx(CrossEncoder, (4, 1))
+        return CrossEncoder(model_name, max_length=max_length, device="cpu", **_onnx_kwargs())
+    if backend == "int8":
+        model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+        model.model = _quantize_int8(model.model)
+        return model
+    return CrossEncoder(model_name, max_length=max_length)
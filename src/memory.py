@@ -0,0 +1,127 @@
+"""Opt-in memory accounting for the pipeline scripts (--memory, --tracemalloc).
+
+A daemon thread samples RSS (and the tracemalloc heap when on) into a timeline tagged with the
+current stage. Each stage records RSS at start/end and its peak: the highest sample, or the
+process ru_maxrss when that grew during the stage, so short spikes between samples still count.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional
+
+from src.utils import peak_rss_mb, rss_mb
+
+_MB = 1024 * 1024
+_NOISE = (
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+)
+
+
+class MemoryMonitor:
+    """`with memory.stage("queries"):` accounts the block when enabled, else does nothing. Stages do not nest.
+
+    Enter it outside profiler.stage() and around any wall timer: the tracemalloc snapshot on exit is slow.
+    """
+
+    def __init__(self, out_dir: Optional[Path], script: str, interval_s: float = 0.25, trace_python: bool = False,
+                 top_sites: int = 5):
+        self.out_dir = Path(out_dir) if out_dir else None
+        self.script = script
+        self.interval = interval_s
+        self.trace_python = trace_python and self.out_dir is not None
+        self.top_sites = top_sites
+        self.timeline: List[tuple] = []
+        self.stages: dict = {}
+        self._stage = ""
+        self._stage_peak = 0.0
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if self.out_dir is not None:
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+            if self.trace_python:
+                tracemalloc.start()
+            self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+            self._thread.start()
+
+    def _sample(self) -> float:
+        rss = rss_mb()
+        heap = tracemalloc.get_traced_memory()[0] / _MB if self.trace_python else None
+        with self._lock:
+            self.timeline.append((time.perf_counter() - self._t0, self._stage, rss, heap))
+            self._stage_peak = max(self._stage_peak, rss)
+        return rss
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.out_dir is None:
+            yield
+            return
+        with self._lock:
+            self._stage = name
+            self._stage_peak = 0.0
+        maxrss_start = peak_rss_mb()
+        if self.trace_python:
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        rss_start = self._sample()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            rss_end = self._sample()
+            maxrss_end = peak_rss_mb()
+            with self._lock:
+                peak = max(self._stage_peak, maxrss_end if maxrss_end > maxrss_start else 0.0)
+                self._stage = ""
+            entry = {
+                "seconds": seconds,
+                "rss_start_mb": rss_start,
+                "rss_end_mb": rss_end,
+                "rss_peak_mb": peak,
+            }
+            if self.trace_python:
+                current, heap_peak = tracemalloc.get_traced_memory()
+                entry["heap_end_mb"] = current / _MB
+                entry["heap_peak_mb"] = heap_peak / _MB
+                entry["top_sites"] = [
+                    {"site": str(stat.traceback[0]), "mb": stat.size / _MB, "blocks": stat.count}
+                    for stat in tracemalloc.take_snapshot().filter_traces(_NOISE).statistics("lineno")[: self.top_sites]
+                ]
+            self.stages[name] = entry
+
+    def close(self) -> None:
+        """Stop sampling; write memory/<script>.timeline.csv and merge this script's stages into memory/peaks.json."""
+        if self.out_dir is None or self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if self.trace_python:
+            tracemalloc.stop()
+        with open(self.out_dir / f"{self.script}.timeline.csv", "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["t_s", "stage", "rss_mb", "heap_mb"])
+            for t, stage, rss, heap in self.timeline:
+                writer.writerow([f"{t:.3f}", stage, f"{rss:.1f}", "" if heap is None else f"{heap:.1f}"])
+        path = self.out_dir / "peaks.json"
+        peaks = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+        peaks = {k: v for k, v in peaks.items() if not k.startswith(f"{self.script}.")}
+        peaks.update({f"{self.script}.{name}": entry for name, entry in self.stages.items()})
+        peaks[f"{self.script}.process"] = {"rss_peak_mb": peak_rss_mb()}
+        path.write_text(json.dumps(peaks, indent=2), encoding="utf-8")
@@ -1,12 +1,25 @@
 from __future__ import annotations
+from collections import defaultdict
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 import math
 
+import numpy as np
+
 @dataclass
 class Qrels:
     qrels: Dict[str, Dict[str, int]]
 
+def load_qrels(data_dir: Path) -> Qrels:
+    qrels = defaultdict(dict)
+    with (data_dir / "qrels.tsv").open("r", encoding="utf-8") as f:
+        next(f)
+        for line in f:
+            qid, doc_id, rel = line.strip().split("\t")
+            qrels[qid][doc_id] = int(rel)
+    return Qrels(qrels=dict(qrels))
+
 def dcg(rels: List[int]) -> float:
     out = 0.0
     for i, r in enumerate(rels, start=1):
@@ -52,3 +65,127 @@ def evaluate_run(
         f"recall@{k_recall}": avg(recalls),
         "num_queries": len(run),
     }
+
+# Vectorized evaluation: queries x ranks integer matrices, all cutoffs in one pass.
+
+@dataclass
+class EncodedQrels:
+    qid_index: Dict[str, int]
+    doc_index: Dict[str, int]
+    keys: np.ndarray        # sorted qidx * n_docs + didx of every judged pair
+    rels: np.ndarray        # relevance aligned with keys
+    ideal_gains: np.ndarray  # per query, judged gains sorted descending, zero padded
+    n_relevant: np.ndarray
+
+@dataclass
+class SystemScores:
+    query_ids: List[str]
+    scores: Dict[str, np.ndarray]  # metric name -> per-query array aligned with query_ids
+
+    def means(self) -> Dict[str, float]:
+        out: Dict[str, float] = {m: float(v.mean()) if v.size else 0.0 for m, v in self.scores.items()}
+        out["num_queries"] = len(self.query_ids)
+        return out
+
+def encode_qrels(qrels_all: Qrels) -> EncodedQrels:
+    qid_index = {qid: i for i, qid in enumerate(qrels_all.qrels)}
+    doc_index: Dict[str, int] = {}
+    qidx, didx, rels = [], [], []
+    for qid, judged in qrels_all.qrels.items():
+        for doc_id, r in judged.items():
+            qidx.append(qid_index[qid])
+            didx.append(doc_index.setdefault(doc_id, len(doc_index)))
+            rels.append(r)
+    n_docs = max(len(doc_index), 1)
+    keys = np.asarray(qidx, dtype=np.int64) * n_docs + np.asarray(didx, dtype=np.int64)
+    order = np.argsort(keys, kind="stable")
+    rel_arr = np.asarray(rels, dtype=np.int64)
+
+    width = max((len(j) for j in qrels_all.qrels.values()), default=0)
+    ideal = np.zeros((len(qid_index), max(width, 1)))
+    n_relevant = np.zeros(len(qid_index), dtype=np.int64)
+    for qid, judged in qrels_all.qrels.items():
+        i = qid_index[qid]
+        g = np.sort(2.0 ** np.fromiter(judged.values(), dtype=np.float64, count=len(judged)) - 1)[::-1]
+        ideal[i, :len(g)] = g
+        n_relevant[i] = sum(1 for r in judged.values() if r > 0)
+    return EncodedQrels(qid_index, doc_index, keys[order], rel_arr[order], ideal, n_relevant)
+
+def encode_run(run: Dict[str, List[str]], enc: EncodedQrels) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """(query ids, qrels row per query or -1, judged doc index matrix with -1 for unjudged/padding)."""
+    qids = list(run)
+    depth = max((len(r) for r in run.values()), default=0)
+    docs = np.full((len(qids), depth), -1, dtype=np.int64)
+    for i, qid in enumerate(qids):
+        ranked = run[qid]
+        docs[i, :len(ranked)] = [enc.doc_index.get(d, -1) for d in ranked]
+    rows = np.asarray([enc.qid_index.get(qid, -1) for qid in qids], dtype=np.int64)
+    return qids, rows, docs
+
+def _first_occurrence(docs: np.ndarray) -> np.ndarray:
+    if docs.size == 0:
+        return np.zeros(docs.shape, dtype=bool)
+    order = np.argsort(docs, axis=1, kind="stable")
+    sorted_docs = np.take_along_axis(docs, order, axis=1)
+    first_sorted = np.ones(docs.shape, dtype=bool)
+    first_sorted[:, 1:] = sorted_docs[:, 1:] != sorted_docs[:, :-1]
+    first = np.empty_like(first_sorted)
+    np.put_along_axis(first, order, first_sorted, axis=1)
+    return first
+
+def score_encoded(rows: np.ndarray, docs: np.ndarray, enc: EncodedQrels,
+                  cutoffs: Tuple[int, ...] = (10, 50)) -> Dict[str, np.ndarray]:
+    """Per-query NDCG/MRR/Recall/MAP/P at every cutoff, matching ndcg_at_k/mrr_at_k/recall_at_k."""
+    n_q, depth = docs.shape
+    n_docs = max(len(enc.doc_index), 1)
+    known = (rows >= 0)[:, None] & (docs >= 0)
+    cand = rows[:, None] * n_docs + docs
+    rel = np.zeros(docs.shape, dtype=np.int64)
+    if enc.keys.size and n_q and depth:
+        pos = np.clip(np.searchsorted(enc.keys, cand), 0, enc.keys.size - 1)
+        hit = known & (enc.keys[pos] == cand)
+        rel = np.where(hit, enc.rels[pos], 0)
+
+    relevant = rel > 0
+    # recall counts distinct documents, like recall_at_k's set intersection
+    relevant_unique = relevant & _first_occurrence(docs)
+    discount = 1.0 / np.log2(np.arange(2, depth + 2))
+    dcg_cum = np.cumsum((2.0 ** rel - 1) * discount, axis=1)
+    hits_cum = np.cumsum(relevant, axis=1)
+    unique_cum = np.cumsum(relevant_unique, axis=1)
+    ap_cum = np.cumsum(relevant_unique * unique_cum / np.arange(1, depth + 1), axis=1)
+    first_rank = np.where(relevant.any(axis=1), relevant.argmax(axis=1) + 1, depth + 1)
+
+    safe_rows = np.where(rows >= 0, rows, 0)
+    ideal = np.where((rows >= 0)[:, None], enc.ideal_gains[safe_rows], 0.0)
+    idcg_cum = np.cumsum(ideal * (1.0 / np.log2(np.arange(2, ideal.shape[1] + 2))), axis=1)
+    n_rel = np.where(rows >= 0, enc.n_relevant[safe_rows], 0)
+
+    def at(cum: np.ndarray, k: int) -> np.ndarray:
+        if cum.shape[1] == 0:
+            return np.zeros(n_q)
+        return cum[:, min(k, cum.shape[1]) - 1]
+
+    out: Dict[str, np.ndarray] = {}
+    for k in cutoffs:
+        idcg = at(idcg_cum, k)
+        out[f"ndcg@{k}"] = np.divide(at(dcg_cum, k), idcg, out=np.zeros(n_q), where=idcg > 0)
+        out[f"mrr@{k}"] = np.where(first_rank <= k, 1.0 / first_rank, 0.0)
+        out[f"recall@{k}"] = np.divide(at(unique_cum, k), n_rel, out=np.zeros(n_q), where=n_rel > 0)
+        out[f"map@{k}"] = np.divide(at(ap_cum, k), n_rel, out=np.zeros(n_q), where=n_rel > 0)
+        out[f"p@{k}"] = at(hits_cum, k) / k
+    return out
+
+def evaluate_runs(
+    runs: Dict[str, Dict[str, List[str]]],
+    qrels_all: Qrels,
+    cutoffs: Tuple[int, ...] = (10, 50),
+    enc: Optional[EncodedQrels] = None,
+) -> Dict[str, SystemScores]:
+    """Evaluate every system at once; qrels are encoded a single time and shared."""
+    enc = enc or encode_qrels(qrels_all)
+    out = {}
+    for name, run in runs.items():
+        qids, rows, docs = encode_run(run, enc)
+        out[name] = SystemScores(qids, score_encoded(rows, docs, enc, cutoffs))
+    return out
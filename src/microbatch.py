@@ -0,0 +1,95 @@
+"""Dynamic micro-batching: merge concurrent rerank requests into one model call."""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+
+Docs = List[Tuple[str, str]]
+Ranked = List[Tuple[str, float]]
+
+
+class MicroBatcher:
+    """One worker thread owns the model. It blocks for the first request, then keeps
+    collecting until the batch holds max_batch pairs or max_wait_ms has passed since
+    that first request, and scores everything in a single call.
+    """
+
+    def __init__(self, score_batch: Callable[[List[Tuple[str, Docs]]], List[Ranked]],
+                 max_batch: int = 256, max_wait_ms: float = 5.0):
+        self.score_batch = score_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[Tuple[List[Tuple[str, Docs]], Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._stats = {"requests": 0, "queries": 0, "pairs": 0, "batches": 0, "busy_s": 0.0, "max_batch_pairs": 0}
+        self._worker = threading.Thread(target=self._run, name="microbatcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, items: List[Tuple[str, Docs]]) -> Future:
+        fut: Future = Future()
+        self._queue.put((items, fut))
+        return fut
+
+    def __call__(self, items: List[Tuple[str, Docs]]) -> List[Ranked]:
+        return self.submit(items).result()
+
+    def _collect(self) -> List[Tuple[List[Tuple[str, Docs]], Future]]:
+        first = self._queue.get()
+        batch = [first]
+        pairs = sum(len(docs) for _, docs in first[0])
+        deadline = time.monotonic() + self.max_wait
+        while pairs < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                nxt = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(nxt)
+            pairs += sum(len(docs) for _, docs in nxt[0])
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            merged = [item for items, _ in batch for item in items]
+            n_pairs = sum(len(docs) for _, docs in merged)
+            t0 = time.monotonic()
+            try:
+                ranked = self.score_batch(merged)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            busy = time.monotonic() - t0
+            pos = 0
+            for items, fut in batch:
+                fut.set_result(ranked[pos:pos + len(items)])
+                pos += len(items)
+            with self._lock:
+                s = self._stats
+                s["requests"] += len(batch)
+                s["queries"] += len(merged)
+                s["pairs"] += n_pairs
+                s["batches"] += 1
+                s["busy_s"] += busy
+                s["max_batch_pairs"] = max(s["max_batch_pairs"], n_pairs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+        uptime = time.monotonic() - self._started
+        s["queue_depth"] = self._queue.qsize()
+        s["uptime_s"] = uptime
+        s["avg_batch_pairs"] = s["pairs"] / s["batches"] if s["batches"] else 0.0
+        s["avg_requests_per_batch"] = s["requests"] / s["batches"] if s["batches"] else 0.0
+        s["pairs_per_s"] = s["pairs"] / uptime if uptime > 0 else 0.0
+        s["model_pairs_per_s"] = s["pairs"] / s["busy_s"] if s["busy_s"] > 0 else 0.0
+        s["utilization"] = s["busy_s"] / uptime if uptime > 0 else 0.0
+        return s
@@ -0,0 +1,300 @@
+"""Per-query hybrid pipeline: retrieve (BM25 + kNN, optionally ES rank.rrf), fuse, rerank.
+
+Shared by 04_run_queries.py and the /search service.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Optional
+
+from src.cascade import cascade_rerank
+from src.config import get_cascade_config, get_fusion_mode, get_rerank_mode
+from src.embed import embed_texts
+from src.es_calls import aprofile_slow, attach, call_es, collect, profile_slow
+from src.fusion import rrf_fuse
+from src.rerank import rerank
+from src.rerank_embedding import rerank_embedding
+from src.search import (
+    MSEARCH_FILTER_PATH,
+    attribute_ms,
+    bm25_body,
+    bm25_search,
+    bm25_search_async,
+    fetch_doc_texts,
+    fetch_doc_texts_async,
+    fetch_doc_vectors,
+    fetch_doc_vectors_async,
+    hit_ids,
+    hybrid_rrf_body,
+    hybrid_rrf_search,
+    hybrid_rrf_search_async,
+    knn_body,
+    knn_search,
+    knn_search_async,
+)
+from src.tracing import span, stage
+
+
+def overlap_at_k(a: list, b: list, k: int = 10) -> float:
+    n = min(k, len(a), len(b))
+    return len(set(a[:n]) & set(b[:n])) / n if n else 0.0
+
+
+async def astage(name: str, timings: dict, coro):
+    with stage(name, timings):
+        return await coro
+
+
+def fuse_stage(rcfg, retrieved: dict) -> list:
+    """Client-side RRF (always run, for the hybrid_rrf system); returns the ids to rerank."""
+    with stage("fusion", retrieved["timings"]):
+        fused_pairs = rrf_fuse([retrieved["bm25_ids"], retrieved["knn_ids"]], rcfg.rrf_k, rcfg.rerank_topn)
+    retrieved["fused_ids"] = [doc_id for doc_id, _ in fused_pairs]
+    retrieved["fused_scores"] = dict(fused_pairs)
+    # FUSION_MODE=server: rerank what the single combined request returned
+    candidates = retrieved.get("server_ids", retrieved["fused_ids"])
+    return candidates[:rcfg.rerank_topn]
+
+
+def build_record(qid: str, retrieved: dict, reranked_pairs: list, rcfg) -> dict:
+    timings = retrieved["timings"]
+    fused_ids = retrieved["fused_ids"]
+    candidates = retrieved.get("server_ids", fused_ids)
+    # Candidates the reranker did not score (past RERANK_TOPN, or cut by the cascade) keep fused order
+    scored = {doc_id for doc_id, _ in reranked_pairs}
+    reranked_ids = [doc_id for doc_id, _ in reranked_pairs] + [d for d in candidates if d not in scored]
+    runs = {
+        "bm25": retrieved["bm25_ids"],
+        "knn": retrieved["knn_ids"],
+        "hybrid_rrf": fused_ids,
+        "hybrid_rrf_rerank": reranked_ids,
+    }
+    latency = {"query_id": qid, **timings, **retrieved.get("rerank_info", {})}
+    # Query embedding and the candidate text/vector fetch are stages too: total_ms counts them
+    client_ms = timings["bm25_ms"] + timings["knn_ms"] + timings["fusion_ms"]
+    common_ms = timings["embed_ms"] + timings["fetch_ms"] + timings["rerank_ms"]
+    if "server_ids" in retrieved:
+        runs["hybrid_rrf_server"] = retrieved["server_ids"]
+        latency["rrf_overlap@10"] = overlap_at_k(fused_ids, retrieved["server_ids"], 10)
+        latency["client_total_ms"] = client_ms + common_ms
+        latency["total_ms"] = timings["server_rrf_ms"] + common_ms
+    else:
+        latency["total_ms"] = client_ms + common_ms
+    return {"query_id": qid, "runs": runs, "latency": latency}
+
+
+def set_wall(record: dict, wall_ms: float) -> dict:
+    """wall_ms is what the query actually took; other_ms = wall_ms minus every stage run
+    (Python glue when sequential, negative when BM25 and kNN overlap under --concurrency)."""
+    latency = record["latency"]
+    stages_ms = latency["client_total_ms"] + latency["server_rrf_ms"] if "server_rrf_ms" in latency else latency["total_ms"]
+    latency["wall_ms"] = wall_ms
+    latency["other_ms"] = wall_ms - stages_ms
+    return record
+
+
+def missing(have: Optional[dict], doc_ids: list) -> list:
+    have = have or {}
+    return [doc_id for doc_id in doc_ids if doc_id not in have]
+
+
+def hit_sinks(rcfg) -> tuple:
+    """(texts, vectors) dicts for hit_ids: RERANK_MODE=embedding needs stored vectors and no text."""
+    if get_rerank_mode() == "embedding":
+        return None, {}
+    return ({} if rcfg.inline_text else None), None
+
+
+def rerank_stage(rcfg, qtext: str, rerank_input: list, retrieved: dict) -> list:
+    """Full rerank of the candidates, the adaptive cascade when RERANK_CASCADE is on, or the
+    vector + rank-feature blend for RERANK_MODE=embedding."""
+    ccfg = get_cascade_config()
+    mode = get_rerank_mode()
+    with stage("rerank", retrieved["timings"], candidates=len(rerank_input), mode=mode) as sp:
+        if mode == "embedding":
+            reranked_pairs = rerank_embedding(
+                retrieved["query_vec"], [doc_id for doc_id, _ in rerank_input], retrieved["vectors"],
+                retrieved["bm25_ids"], retrieved["knn_ids"], retrieved["fused_scores"], rcfg.rrf_k,
+            )
+            info = {"rerank_pairs": len(rerank_input), "rerank_steps": 1, "cascade_stop": ""}
+        elif ccfg.enabled:
+            rrf = retrieved["fused_scores"]
+            rrf_scores = [rrf.get(doc_id, 0.0) for doc_id, _ in rerank_input]
+            reranked_pairs, info = cascade_rerank(qtext, rerank_input, rrf_scores, ccfg, rerank)
+            sp.set(pairs=info["rerank_pairs"], cascade_stop=info["cascade_stop"])
+        else:
+            reranked_pairs = rerank(qtext, rerank_input)
+            info = {"rerank_pairs": len(rerank_input), "rerank_steps": 1, "cascade_stop": ""}
+    info["rerank_pairs_saved"] = len(rerank_input) - info["rerank_pairs"]
+    retrieved["rerank_info"] = info
+    return reranked_pairs
+
+
+def finish_query(es, index: str, rcfg, qid: str, qtext: str, retrieved: dict, rerank: bool = True) -> dict:
+    to_rerank = fuse_stage(rcfg, retrieved)
+    timings = retrieved["timings"]
+    if not rerank:
+        # Caller only wants the retrieval/fusion lists: no candidate fetch, no cross-encoder
+        timings["fetch_ms"] = timings["rerank_ms"] = 0.0
+        record = build_record(qid, retrieved, [], rcfg)
+        del record["runs"]["hybrid_rrf_rerank"]
+        return record
+    if retrieved.get("vectors") is not None:
+        todo = missing(retrieved["vectors"], to_rerank)
+        with stage("fetch", timings, docs=len(todo)):
+            retrieved["vectors"].update(fetch_doc_vectors(es, index, todo))
+        rerank_input = [(doc_id, "") for doc_id in to_rerank]
+    else:
+        doc_texts = dict(retrieved.get("texts") or {})
+        todo = missing(retrieved.get("texts"), to_rerank)
+        with stage("fetch", timings, docs=len(todo)):
+            doc_texts.update(fetch_doc_texts(es, index, todo))
+        rerank_input = [(doc_id, doc_texts.get(doc_id, "")) for doc_id in to_rerank]
+    reranked_pairs = rerank_stage(rcfg, qtext, rerank_input, retrieved)
+    return build_record(qid, retrieved, reranked_pairs, rcfg)
+
+
+def process_query(es, index: str, rcfg, q: dict, rerank: bool = True) -> dict:
+    """One query through every stage; rerank=False stops after fusion (no hybrid_rrf_rerank run)."""
+    qid = q["query_id"]
+    qtext = q["query"]
+    t0 = time.perf_counter_ns()
+    timings = {}
+    with span("query", query_id=qid), collect(qid) as calls:
+        with stage("embed", timings):
+            (qvec,) = embed_texts([qtext])
+
+        texts, vectors = hit_sinks(rcfg)
+        with stage("bm25", timings):
+            bm25_ids = bm25_search(es, index, qtext, rcfg.topn, texts, vectors)
+        with stage("knn", timings):
+            knn_ids = knn_search(es, index, qvec, rcfg.topn, rcfg.knn_candidates, texts, vectors)
+        retrieved = {
+            "bm25_ids": bm25_ids,
+            "knn_ids": knn_ids,
+            "texts": texts,
+            "vectors": vectors,
+            "query_vec": qvec,
+            "timings": timings,
+        }
+        if get_fusion_mode() == "server":
+            with stage("server_rrf", timings):
+                retrieved["server_ids"] = hybrid_rrf_search(es, index, qtext, qvec, rcfg, texts, vectors)
+        record = finish_query(es, index, rcfg, qid, qtext, retrieved, rerank)
+        set_wall(record, (time.perf_counter_ns() - t0) / 1e6)
+    return attach(record, calls, profile_slow(calls))
+
+
+def msearch_retrieve(es, index: str, rcfg, texts: list, vecs: list) -> list:
+    """BM25 + kNN (+ server-side RRF) for a window of queries in one _msearch; returns one retrieved dict per query."""
+    server = get_fusion_mode() == "server"
+    per_query = 3 if server else 2
+    sink_texts, sink_vectors = hit_sinks(rcfg)
+    with_text, with_vectors = sink_texts is not None, sink_vectors is not None
+    searches = []
+    for qtext, qvec in zip(texts, vecs):
+        searches.append({"index": index})
+        searches.append(bm25_body(qtext, rcfg.topn, with_text, with_vectors))
+        searches.append({"index": index})
+        searches.append(knn_body(qvec, rcfg.topn, rcfg.knn_candidates, with_text, with_vectors))
+        if server:
+            searches.append({"index": index})
+            searches.append(hybrid_rrf_body(qtext, qvec, rcfg, with_text, with_vectors))
+    timings = {}
+    with stage("msearch", timings, searches=len(texts) * per_query):
+        resp = call_es("msearch", es.msearch, searches=searches, filter_path=MSEARCH_FILTER_PATH)
+    batch_ms = timings["msearch_ms"]
+    responses = resp["responses"]
+    for r in responses:
+        if "error" in r:
+            raise RuntimeError(f"_msearch sub-request failed: {r['error']}")
+    shares = attribute_ms(batch_ms, [r.get("took", 0) for r in responses])
+    out = []
+    for j in range(len(texts)):
+        base = per_query * j
+        doc_texts, doc_vectors = hit_sinks(rcfg)
+        retrieved = {
+            "bm25_ids": hit_ids(responses[base], doc_texts, doc_vectors),
+            "knn_ids": hit_ids(responses[base + 1], doc_texts, doc_vectors),
+            "texts": doc_texts,
+            "vectors": doc_vectors,
+            "query_vec": vecs[j],
+            "timings": {"bm25_ms": shares[base], "knn_ms": shares[base + 1]},
+        }
+        if server:
+            retrieved["server_ids"] = hit_ids(responses[base + 2], doc_texts, doc_vectors)
+            retrieved["timings"]["server_rrf_ms"] = shares[base + 2]
+        out.append(retrieved)
+    return out
+
+
+def process_window(es, index: str, rcfg, window: list) -> list:
+    """One batched embed + one _msearch for the window; each query is charged an equal share of
+    the embed and its took-weighted share of the _msearch round trip."""
+    texts = [q["query"] for q in window]
+    shared = {}
+    records = []
+    with span("window", size=len(window)):
+        t0 = time.perf_counter_ns()
+        with collect(window[0]["query_id"]) as window_calls:  # the _msearch is logged under the window's first query
+            with stage("embed", shared):
+                vecs = embed_texts(texts)
+            retrieved = msearch_retrieve(es, index, rcfg, texts, vecs)
+        shared_ms = (time.perf_counter_ns() - t0) / 1e6 / len(window)
+        for q, r in zip(window, retrieved):
+            r["timings"]["embed_ms"] = shared["embed_ms"] / len(window)
+            t1 = time.perf_counter_ns()
+            with span("query", query_id=q["query_id"]), collect(q["query_id"]) as calls:
+                record = finish_query(es, index, rcfg, q["query_id"], q["query"], r)
+            set_wall(record, shared_ms + (time.perf_counter_ns() - t1) / 1e6)
+            if not records:
+                calls.rows[:0] = window_calls.rows
+            records.append(attach(record, calls, profile_slow(calls)))
+    return records
+
+
+async def process_query_async(aes, index: str, rcfg, q: dict) -> dict:
+    """Same stages as process_query; ES calls are awaited and model calls run in worker threads."""
+    qid = q["query_id"]
+    qtext = q["query"]
+    t0 = time.perf_counter_ns()
+    timings = {}
+    with span("query", query_id=qid), collect(qid) as calls:
+        (qvec,) = await astage("embed", timings, asyncio.to_thread(embed_texts, [qtext]))
+
+        texts, vectors = hit_sinks(rcfg)
+        searches = [
+            astage("bm25", timings, bm25_search_async(aes, index, qtext, rcfg.topn, texts, vectors)),
+            astage("knn", timings, knn_search_async(aes, index, qvec, rcfg.topn, rcfg.knn_candidates, texts, vectors)),
+        ]
+        if get_fusion_mode() == "server":
+            searches.append(astage("server_rrf", timings, hybrid_rrf_search_async(aes, index, qtext, qvec, rcfg, texts, vectors)))
+        results = await asyncio.gather(*searches)
+        retrieved = {
+            "bm25_ids": results[0],
+            "knn_ids": results[1],
+            "texts": texts,
+            "vectors": vectors,
+            "query_vec": qvec,
+            "timings": timings,
+        }
+        if len(results) > 2:
+            retrieved["server_ids"] = results[2]
+
+        to_rerank = fuse_stage(rcfg, retrieved)
+        if vectors is not None:
+            todo = missing(vectors, to_rerank)
+            vectors.update(await astage("fetch", timings, fetch_doc_vectors_async(aes, index, todo)))
+            rerank_input = [(doc_id, "") for doc_id in to_rerank]
+            reranked_pairs = rerank_stage(rcfg, qtext, rerank_input, retrieved)  # NumPy only, no thread hop
+        else:
+            doc_texts = dict(texts or {})
+            todo = missing(texts, to_rerank)
+            doc_texts.update(await astage("fetch", timings, fetch_doc_texts_async(aes, index, todo)))
+            rerank_input = [(doc_id, doc_texts.get(doc_id, "")) for doc_id in to_rerank]
+            reranked_pairs = await asyncio.to_thread(rerank_stage, rcfg, qtext, rerank_input, retrieved)
+        record = build_record(qid, retrieved, reranked_pairs, rcfg)
+        set_wall(record, (time.perf_counter_ns() - t0) / 1e6)
+    return attach(record, calls, await aprofile_slow(calls))
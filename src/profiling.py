@@ -0,0 +1,147 @@
+"""Opt-in per-stage profiling for the pipeline scripts (--profile).
+
+Each stage gets a cProfile run (deterministic, calling thread only) written as .pstats, and a
+wall-clock stack sampler over all threads (embed workers, asyncio.to_thread, the bulk producer)
+written as collapsed stacks ("thread;outer;...;inner count", for flamegraph.pl or speedscope).
+The top self-time functions of both go into profiles/hotspots.json for the run README.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+# The samplers' own threads, and stdlib leaf frames a thread sits in while blocked (Event/Condition
+# waits, queue gets, selector polls, joins, an idle ThreadPoolExecutor worker): wall-clock samples of these
+# are idle time, not work, and would otherwise dominate the sampled hotspots.
+_SAMPLER_THREADS = ("stack-sampler", "memory-sampler")
+_STDLIB = os.path.dirname(threading.__file__)
+_IDLE_LEAVES = {"wait", "sleep", "get", "select", "poll", "acquire", "_worker", "_wait_for_tstate_lock"}
+
+
+def _is_idle(code) -> bool:
+    return code.co_name in _IDLE_LEAVES and os.path.dirname(code.co_filename).startswith(_STDLIB) \
+        and "site-packages" not in code.co_filename
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _func_label(func: tuple) -> str:
+    """pstats (file, line, name) in the same form as sampled frames; built-ins keep their pstats name."""
+    filename, line, name = func
+    if filename == "~":
+        return pstats.func_std_string(func)
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+class StackSampler:
+    """Samples every busy thread's Python stack each `interval_ms` from a daemon thread.
+
+    Stacks blocked in a stdlib wait and the samplers' own threads are only counted in `idle`.
+    """
+
+    def __init__(self, interval_ms: float = 5.0):
+        self.interval = interval_ms / 1000
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if names.get(ident) in _SAMPLER_THREADS:
+                    continue
+                if _is_idle(frame.f_code):
+                    self.idle += 1
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def leaf_counts(self) -> Counter:
+        leaves: Counter = Counter()
+        for stack, n in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += n
+        return leaves
+
+
+class Profiler:
+    """`with profiler.stage("queries"):` profiles the block when enabled, else does nothing. Stages do not nest."""
+
+    def __init__(self, out_dir: Optional[Path], script: str, top: int = 15, interval_ms: float = 5.0):
+        self.out_dir = Path(out_dir) if out_dir else None
+        self.script = script
+        self.top = top
+        self.interval_ms = interval_ms
+        if self.out_dir is not None:
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.out_dir is None:
+            yield
+            return
+        prof = cProfile.Profile()
+        sampler = StackSampler(self.interval_ms)
+        t0 = time.perf_counter()
+        sampler.start()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            sampler.stop()
+            self._write(name, prof, sampler, time.perf_counter() - t0)
+
+    def _write(self, name: str, prof: cProfile.Profile, sampler: StackSampler, wall_s: float) -> None:
+        prefix = self.out_dir / f"{self.script}.{name}"
+        prof.dump_stats(f"{prefix}.pstats")
+        with open(f"{prefix}.collapsed", "w", encoding="utf-8") as f:
+            for stack, n in sampler.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+        stats = pstats.Stats(prof).stats
+        by_self = sorted(stats.items(), key=lambda kv: kv[1][2], reverse=True)[: self.top]
+        total_samples = sum(sampler.stacks.values()) or 1
+        entry = {
+            "wall_s": wall_s,
+            "samples": sampler.samples,
+            "idle_share": sampler.idle / (sampler.idle + sum(sampler.stacks.values()) or 1),
+            "cprofile": [
+                {"function": _func_label(func), "ncalls": nc, "tottime_s": tt, "cumtime_s": ct}
+                for func, (cc, nc, tt, ct, callers) in by_self
+            ],
+            "sampled": [
+                {"frame": frame, "share": n / total_samples}
+                for frame, n in sampler.leaf_counts().most_common(self.top)
+            ],
+        }
+        path = self.out_dir / "hotspots.json"
+        hotspots = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+        hotspots[f"{self.script}.{name}"] = entry
+        path.write_text(json.dumps(hotspots, indent=2), encoding="utf-8")
@@ -1,45 +1,169 @@
 from __future__ import annotations
+import logging
 import os
-from typing import List, Tuple, Dict, Any
+import threading
+from functools import lru_cache
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=4)
+def get_cross_encoder(model_name: Optional[str] = None, max_length: Optional[int] = None, backend: Optional[str] = None):
+    """Process-wide cross-encoder registry: each (model, max_length, backend) is loaded once."""
+    from src.config import get_reranker_model, get_rerank_max_length
+    from src.inference import load_cross_encoder
+    return load_cross_encoder(model_name or get_reranker_model(), max_length or get_rerank_max_length(), backend)
+
+# Cumulative padding accounting for local cross-encoder calls (see rerank_stats), in characters.
+# Kept with bucketing on or off, so either run shows what the other order would have cost.
+_PAD_STATS = {"pairs": 0, "char_clipped": 0, "chars": 0, "padded_chars_sorted": 0, "padded_chars_unsorted": 0}
+_PAD_LOCK = threading.Lock()
+# Word-piece tokens are rarely longer than this many characters, so clipping a document at
+# max_length * _CHARS_PER_TOKEN never changes what survives truncation but keeps tokenizing cheap.
+_CHARS_PER_TOKEN = 10
+
+def _padded_length(lengths: List[int], batch_size: int) -> int:
+    return sum(max(lengths[i:i + batch_size]) * len(lengths[i:i + batch_size]) for i in range(0, len(lengths), batch_size))
+
+def _score_pairs(pairs: List[List[str]]) -> List[float]:
+    """Predict in length order so batches pad little, then restore the caller's order.
+
+    Pairs are sorted by character length, a proxy for token length: the model's fast tokenizer is
+    shared across threads and is only safe to call with the settings predict() uses, and
+    tokenizing twice would cost as much as the padding saved. Each pair is capped at
+    RERANK_MAX_LENGTH tokens; documents are clipped by characters first so very long bodies are
+    not tokenized in full.
+    """
+    from src.config import get_rerank_batch_size, get_rerank_length_bucketing, get_rerank_max_length
+    if not pairs:
+        return []
+    model = get_cross_encoder()
+    batch_size = get_rerank_batch_size()
+    max_length = get_rerank_max_length()
+    max_chars = max_length * _CHARS_PER_TOKEN
+    char_clipped = sum(1 for _, d in pairs if len(d) > max_chars)
+    pairs = [[q, d[:max_chars]] for q, d in pairs]
+    lengths = [len(q) + len(d) for q, d in pairs]
+    order = sorted(range(len(pairs)), key=lengths.__getitem__)
+    with _PAD_LOCK:
+        _PAD_STATS["pairs"] += len(pairs)
+        _PAD_STATS["char_clipped"] += char_clipped
+        _PAD_STATS["chars"] += sum(lengths)
+        _PAD_STATS["padded_chars_sorted"] += _padded_length([lengths[i] for i in order], batch_size)
+        _PAD_STATS["padded_chars_unsorted"] += _padded_length(lengths, batch_size)
+    if not get_rerank_length_bucketing() or len(pairs) <= 1:
+        return model.predict(pairs, batch_size=batch_size, show_progress_bar=False).tolist()
+
+    sorted_scores = model.predict([pairs[i] for i in order], batch_size=batch_size, show_progress_bar=False)
+    scores = [0.0] * len(pairs)
+    for pos, i in enumerate(order):
+        scores[i] = float(sorted_scores[pos])
+    return scores
+
+def rerank_stats() -> dict:
+    """Estimated padding efficiency (real / padded length, in characters) of length-sorted batches and
+    of the arrival order; `bucketing` says which one predict() used. `char_clipped` counts documents
+    cut at RERANK_MAX_LENGTH * 10 characters, not pairs the tokenizer truncated to the token budget."""
+    from src.config import get_rerank_length_bucketing
+    with _PAD_LOCK:
+        st = dict(_PAD_STATS)
+    st["bucketing"] = get_rerank_length_bucketing()
+    st["efficiency_sorted"] = st["chars"] / st["padded_chars_sorted"] if st["padded_chars_sorted"] else 0.0
+    st["efficiency_unsorted"] = st["chars"] / st["padded_chars_unsorted"] if st["padded_chars_unsorted"] else 0.0
+    return st
+
 def rerank_local_cross_encoder(query: str, docs: List[Tuple[str, str]]) -> List[Tuple[str, float]]:
-    from sentence_transformers import CrossEncoder
-    from src.config import get_reranker_model
-    model = CrossEncoder(get_reranker_model())
-    pairs = [[query, text] for _, text in docs]
-    scores = model.predict(pairs).tolist()
-    ranked = sorted([(doc_id, float(s)) for (doc_id, _), s in zip(docs, scores)], key=lambda x: x[1], reverse=True)
-    return ranked
+    return rerank_local_cross_encoder_batch([(query, docs)])[0]
+
+def rerank_local_cross_encoder_batch(
+    items: List[Tuple[str, List[Tuple[str, str]]]]
+) -> List[List[Tuple[str, float]]]:
+    """Score the (query, doc) pairs of many queries in one predict call, then split per query."""
+    pairs = [[query, text] for query, docs in items for _, text in docs]
+    scores = _score_pairs(pairs)
+    out = []
+    pos = 0
+    for _, docs in items:
+        chunk = scores[pos:pos + len(docs)]
+        pos += len(docs)
+        ranked = sorted([(doc_id, float(s)) for (doc_id, _), s in zip(docs, chunk)], key=lambda x: x[1], reverse=True)
+        out.append(ranked)
+    return out
 
 def rerank_http(query: str, docs: List[Tuple[str, str]]) -> List[Tuple[str, float]]:
-    import requests
-    url = os.getenv("RERANK_HTTP_URL")
-    if not url:
-        raise ValueError("RERANK_HTTP_URL not set but RERANK_MODE=http")
-    header = os.getenv("RERANK_HTTP_AUTH_HEADER", "")
-    headers = {}
-    if header:
-        # Put full header string like: "Authorization: Bearer XXX"
-        if ":" in header:
-            k, v = header.split(":", 1)
-            headers[k.strip()] = v.strip()
-    payload = {
-        "query": query,
-        "documents": [{"id": doc_id, "text": text} for doc_id, text in docs],
-    }
-    r = requests.post(url, json=payload, headers=headers, timeout=60)
-    r.raise_for_status()
-    data: Dict[str, Any] = r.json()
-    results = data.get("results", [])
-    ranked = [(item["id"], float(item.get("score", 0.0))) for item in results]
-    ranked.sort(key=lambda x: x[1], reverse=True)
-    return ranked
+    from src.rerank_http import get_http_client
+    return get_http_client().rerank(query, docs)
+
+def rerank_http_batch(items: List[Tuple[str, List[Tuple[str, str]]]]) -> List[List[Tuple[str, float]]]:
+    from src.rerank_http import get_http_client
+    return get_http_client().rerank_many(items)
+
+def warm_up() -> None:
+    """Load the local reranker up front so the first query does not pay for model load."""
+    if _rerank_mode() == "local":
+        get_cross_encoder()
+
+def _rerank_mode() -> str:
+    from src.config import get_rerank_mode
+    return get_rerank_mode()
+
+def _cache_model_key() -> str:
+    """Everything that changes a score: mode, model (or endpoint), truncation length and inference backend."""
+    from src.config import get_reranker_model, get_rerank_max_length
+    if _rerank_mode() == "http":
+        return f"http:{os.getenv('RERANK_HTTP_URL', '')}"
+    from src.inference import resolve_backend
+    return f"local:{get_reranker_model()}:{get_rerank_max_length()}:{resolve_backend()}"
+
+def _drop_unsent(items: List[Tuple[str, List[Tuple[str, str]]]], results: List[List[Tuple[str, float]]]) -> List[List[Tuple[str, float]]]:
+    """Keep only ids each query actually sent; a remote reranker may answer with ids it was not given."""
+    out = []
+    for (query, docs), ranked in zip(items, results):
+        sent = {doc_id for doc_id, _ in docs}
+        kept = [(doc_id, s) for doc_id, s in ranked if doc_id in sent]
+        if len(kept) < len(ranked):
+            logger.warning("reranker returned %d ids that were not sent for query %r; ignoring them",
+                           len(ranked) - len(kept), query)
+        out.append(kept)
+    return out
+
+def _rerank_uncached(items: List[Tuple[str, List[Tuple[str, str]]]]) -> List[List[Tuple[str, float]]]:
+    if _rerank_mode() == "http":
+        return _drop_unsent(items, rerank_http_batch(items))
+    return rerank_local_cross_encoder_batch(items)
+
+def rerank_batch(items: List[Tuple[str, List[Tuple[str, str]]]]) -> List[List[Tuple[str, float]]]:
+    """Rerank many queries; with RERANK_CACHE_PATH set, only unseen (query, doc) pairs are scored."""
+    from src.rerank_cache import get_rerank_cache
+    from src.tracing import span
+    cache = get_rerank_cache()
+    if cache is None:
+        with span("rerank.model", pairs=sum(len(docs) for _, docs in items)):
+            return _rerank_uncached(items)
+
+    model = _cache_model_key()
+    with span("rerank.cache_lookup"):
+        known = [cache.lookup(model, query, docs) for query, docs in items]
+    todo = [(query, [d for i, d in enumerate(docs) if i not in found]) for (query, docs), found in zip(items, known)]
+    pending = [t for t in todo if t[1]]
+    with span("rerank.model", pairs=sum(len(docs) for _, docs in pending)):
+        scored_iter = iter(_rerank_uncached(pending) if pending else [])
+
+    out = []
+    for (query, docs), found, (_, missing) in zip(items, known, todo):
+        new_scores = dict(next(scored_iter)) if missing else {}
+        text_of = dict(missing)
+        cache.store(model, query, [(text_of[doc_id], s) for doc_id, s in new_scores.items()])
+        ranked = [
+            (doc_id, found[i] if i in found else new_scores.get(doc_id, float("-inf")))
+            for i, (doc_id, _) in enumerate(docs)
+        ]
+        ranked.sort(key=lambda x: x[1], reverse=True)
+        out.append(ranked)
+    return out
 
 def rerank(query: str, docs: List[Tuple[str, str]]) -> List[Tuple[str, float]]:
-    mode = os.getenv("RERANK_MODE", "local").lower().strip()
-    if mode == "http":
-        return rerank_http(query, docs)
-    return rerank_local_cross_encoder(query, docs)
+    return rerank_batch([(query, docs)])[0]
@@ -0,0 +1,92 @@
+"""Persistent (model, query, document content) -> rerank score cache in SQLite."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class RerankScoreCache:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            " model TEXT NOT NULL, qhash BLOB NOT NULL, dhash BLOB NOT NULL, score REAL NOT NULL,"
+            " PRIMARY KEY (model, qhash, dhash)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def lookup(self, model: str, query: str, docs: List[Tuple[str, str]]) -> Dict[int, float]:
+        """Scores already known for these docs, keyed by position in `docs`."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT dhash, score FROM scores WHERE model = ? AND qhash = ?", (model, _digest(query))
+            ).fetchall()
+        known = dict(rows)
+        found = {}
+        for i, (_, text) in enumerate(docs):
+            score = known.get(_digest(text))
+            if score is not None:
+                found[i] = score
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(docs) - len(found)
+        return found
+
+    def store(self, model: str, query: str, scored_texts: List[Tuple[str, float]]) -> None:
+        qhash = _digest(query)
+        rows = [(model, qhash, _digest(text), float(score)) for text, score in scored_texts]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0}
+
+
+def get_rerank_cache_path() -> Optional[Path]:
+    """RERANK_CACHE_PATH enables the cache; empty (default) disables it."""
+    path = os.getenv("RERANK_CACHE_PATH", "").strip()
+    if not path:
+        return None
+    p = Path(path)
+    return (_PROJECT_ROOT / p) if not p.is_absolute() else p
+
+
+_OPEN_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _open_cache(path: Optional[Path]) -> Optional[RerankScoreCache]:
+    return RerankScoreCache(path) if path else None
+
+
+def get_rerank_cache() -> Optional[RerankScoreCache]:
+    """One cache per path for the process; the lock keeps threads racing the first call from opening two
+    (each would count its own hits and misses)."""
+    path = get_rerank_cache_path()
+    with _OPEN_LOCK:
+        return _open_cache(path)
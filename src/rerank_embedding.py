@@ -0,0 +1,87 @@
+"""RERANK_MODE=embedding: rescore fused candidates from their stored vectors and rank features, no model call."""
+
+from __future__ import annotations
+
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+FEATURES = ("cosine", "rrf", "bm25_rr", "knn_rr")
+DEFAULT_WEIGHTS = {"cosine": 1.0, "rrf": 0.5, "bm25_rr": 0.25, "knn_rr": 0.0}
+
+
+def _reciprocal_ranks(ranked_ids: Sequence[str]) -> Dict[str, float]:
+    return {doc_id: 1.0 / rank for rank, doc_id in enumerate(ranked_ids, start=1)}
+
+
+def candidate_features(
+    query_vec: Sequence[float],
+    candidates: Sequence[str],
+    vectors: Dict[str, Sequence[float]],
+    bm25_ids: Sequence[str],
+    knn_ids: Sequence[str],
+    rrf_scores: Dict[str, float],
+    rrf_k: int,
+) -> np.ndarray:
+    """(candidates x FEATURES) matrix. Cosine is 0 for a candidate whose vector was not returned.
+
+    RRF is rescaled so a document ranked first in both lists scores 1.
+    """
+    n = len(candidates)
+    X = np.zeros((n, len(FEATURES)), dtype=np.float32)
+    if not n:
+        return X
+    q = np.asarray(query_vec, dtype=np.float32)
+    q /= np.linalg.norm(q) or 1.0
+    have = [i for i, d in enumerate(candidates) if d in vectors]
+    if have:
+        D = np.asarray([vectors[candidates[i]] for i in have], dtype=np.float32)
+        D /= np.maximum(np.linalg.norm(D, axis=1, keepdims=True), 1e-12)
+        X[have, 0] = D @ q
+    bm25_rr, knn_rr = _reciprocal_ranks(bm25_ids), _reciprocal_ranks(knn_ids)
+    scale = (rrf_k + 1) / 2
+    for i, d in enumerate(candidates):
+        X[i, 1] = rrf_scores.get(d, 0.0) * scale
+        X[i, 2] = bm25_rr.get(d, 0.0)
+        X[i, 3] = knn_rr.get(d, 0.0)
+    return X
+
+
+def get_embed_weights_path() -> Optional[Path]:
+    """RERANK_EMBED_WEIGHTS: JSON written by fit_embedding_reranker.py; unset uses DEFAULT_WEIGHTS."""
+    path = os.getenv("RERANK_EMBED_WEIGHTS", "").strip()
+    if not path:
+        return None
+    p = Path(path)
+    return (_PROJECT_ROOT / p) if not p.is_absolute() else p
+
+
+@lru_cache(maxsize=1)
+def get_blend_weights() -> np.ndarray:
+    path = get_embed_weights_path()
+    weights = dict(DEFAULT_WEIGHTS)
+    if path is not None:
+        weights.update(json.loads(path.read_text(encoding="utf-8"))["weights"])
+    return np.asarray([weights[f] for f in FEATURES], dtype=np.float32)
+
+
+def rerank_embedding(
+    query_vec: Sequence[float],
+    candidates: Sequence[str],
+    vectors: Dict[str, Sequence[float]],
+    bm25_ids: Sequence[str],
+    knn_ids: Sequence[str],
+    rrf_scores: Dict[str, float],
+    rrf_k: int,
+    weights: Optional[np.ndarray] = None,
+) -> List[Tuple[str, float]]:
+    X = candidate_features(query_vec, candidates, vectors, bm25_ids, knn_ids, rrf_scores, rrf_k)
+    scores = X @ (get_blend_weights() if weights is None else weights)
+    order = np.argsort(-scores, kind="stable")
+    return [(candidates[i], float(scores[i])) for i in order]
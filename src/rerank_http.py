@@ -0,0 +1,121 @@
+"""Pooled, retrying HTTP client for RERANK_MODE=http.
+
+Single-query contract: {"query", "documents": [{"id", "text"}]} -> {"results": [{"id", "score"}]}.
+Multi-query contract (RERANK_HTTP_BATCH > 1): {"requests": [<single payload>, ...]} ->
+{"responses": [<single response>, ...]}, in the same order.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+Docs = List[Tuple[str, str]]
+Ranked = List[Tuple[str, float]]
+
+
+def payload(query: str, docs: Docs) -> Dict[str, Any]:
+    return {
+        "query": query,
+        "documents": [{"id": doc_id, "text": text} for doc_id, text in docs],
+    }
+
+
+def parse_results(data: Dict[str, Any]) -> Ranked:
+    results = data.get("results", [])
+    ranked = [(item["id"], float(item.get("score", 0.0))) for item in results]
+    ranked.sort(key=lambda x: x[1], reverse=True)
+    return ranked
+
+
+def parse_auth_header(header: str) -> Dict[str, str]:
+    # Full header string like: "Authorization: Bearer XXX"
+    if header and ":" in header:
+        k, v = header.split(":", 1)
+        return {k.strip(): v.strip()}
+    return {}
+
+
+class RerankHttpClient:
+    def __init__(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+        concurrency: int = 4,
+        batch_size: int = 1,
+    ):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False,
+        )
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency) if self.concurrency > 1 else None
+
+    def _post(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        r = self.session.post(self.url, json=body, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def rerank(self, query: str, docs: Docs) -> Ranked:
+        return parse_results(self._post(payload(query, docs)))
+
+    def _rerank_group(self, group: List[Tuple[str, Docs]]) -> List[Ranked]:
+        if len(group) == 1:
+            return [self.rerank(*group[0])]
+        data = self._post({"requests": [payload(q, docs) for q, docs in group]})
+        responses = data.get("responses", [])
+        if len(responses) != len(group):
+            raise ValueError(f"Rerank server returned {len(responses)} responses for {len(group)} requests")
+        return [parse_results(r) for r in responses]
+
+    def rerank_many(self, items: List[Tuple[str, Docs]]) -> List[Ranked]:
+        """Split into groups of batch_size queries and keep up to `concurrency` requests in flight."""
+        groups = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+        if self._pool is None or len(groups) == 1:
+            results = [self._rerank_group(g) for g in groups]
+        else:
+            results = list(self._pool.map(self._rerank_group, groups))
+        return [ranked for group in results for ranked in group]
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+        self.session.close()
+
+
+@lru_cache(maxsize=1)
+def get_http_client() -> RerankHttpClient:
+    url = os.getenv("RERANK_HTTP_URL")
+    if not url:
+        raise ValueError("RERANK_HTTP_URL not set but RERANK_MODE=http")
+    return RerankHttpClient(
+        url,
+        headers=parse_auth_header(os.getenv("RERANK_HTTP_AUTH_HEADER", "")),
+        connect_timeout=float(os.getenv("RERANK_HTTP_CONNECT_TIMEOUT", "5")),
+        read_timeout=float(os.getenv("RERANK_HTTP_TIMEOUT", "60")),
+        retries=int(os.getenv("RERANK_HTTP_RETRIES", "3")),
+        backoff=float(os.getenv("RERANK_HTTP_BACKOFF", "0.5")),
+        concurrency=int(os.getenv("RERANK_HTTP_CONCURRENCY", "4")),
+        batch_size=int(os.getenv("RERANK_HTTP_BATCH", "1")),
+    )
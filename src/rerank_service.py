@@ -0,0 +1,82 @@
+"""HTTP side of the RERANK_MODE=http contract, shared by the stub and the model-backed server."""
+
+from __future__ import annotations
+
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Docs = List[Tuple[str, str]]
+Ranked = List[Tuple[str, float]]
+ScoreBatch = Callable[[List[Tuple[str, Docs]]], List[Ranked]]
+
+
+def parse_request(body: Dict[str, Any]) -> Tuple[List[Tuple[str, Docs]], bool]:
+    """(query, docs) items and whether the payload used the multi-query form."""
+    if "requests" in body:
+        reqs, multi = body["requests"], True
+    else:
+        reqs, multi = [body], False
+    items = []
+    for r in reqs:
+        docs = [(str(d["id"]), d.get("text", "")) for d in r.get("documents", [])]
+        items.append((r.get("query", ""), docs))
+    return items, multi
+
+
+def format_response(ranked: List[Ranked], multi: bool) -> Dict[str, Any]:
+    responses = [{"results": [{"id": doc_id, "score": score} for doc_id, score in r]} for r in ranked]
+    return {"responses": responses} if multi else responses[0]
+
+
+def make_handler(score_batch: ScoreBatch, stats: Optional[Callable[[], Dict[str, Any]]] = None):
+    class RerankHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so pooled clients reuse connections
+        disable_nagle_algorithm = True  # headers and body go out as separate writes; avoid the delayed-ACK stall
+
+        def _send(self, code: int, obj: Dict[str, Any]) -> None:
+            data = json.dumps(obj).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/stats" and stats is not None:
+                self._send(200, stats())
+            elif self.path == "/healthz":
+                self._send(200, {"status": "ok"})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", "0"))
+                items, multi = parse_request(json.loads(self.rfile.read(length) or b"{}"))
+            except (ValueError, KeyError, TypeError) as e:
+                self._send(400, {"error": f"bad request: {e}"})
+                return
+            try:
+                ranked = score_batch(items)
+            except Exception as e:  # surface model errors as 500s rather than dropping the connection
+                self._send(500, {"error": str(e)})
+                return
+            self._send(200, format_response(ranked, multi))
+
+        def log_message(self, format, *args):
+            pass
+
+    return RerankHandler
+
+
+def serve(score_batch: ScoreBatch, host: str, port: int, stats: Optional[Callable[[], Dict[str, Any]]] = None) -> None:
+    server = ThreadingHTTPServer((host, port), make_handler(score_batch, stats))
+    server.daemon_threads = True
+    print(f"Rerank server on http://{host}:{port}/ (POST rerank, GET /stats, GET /healthz)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,169 @@
+"""Elasticsearch request bodies and response parsing shared by the pipeline scripts and services."""
+
+from __future__ import annotations
+
+from typing import List, Optional, Tuple
+
+from src.es_calls import acall_es, call_es
+
+# Hits only need ids (plus title/body when texts are returned inline); the embedding only for RERANK_MODE=embedding.
+SOURCE_FIELDS = ["title", "body"]
+VECTOR_FIELD = "embedding"
+SEARCH_FILTER_PATH = ["took", "hits.hits._id", "hits.hits._score", "hits.hits._source"]
+MSEARCH_FILTER_PATH = ["took", "responses.took", "responses.error"] + [f"responses.{f}" for f in SEARCH_FILTER_PATH[1:]]
+MGET_FILTER_PATH = ["docs._id", "docs.found", "docs._source"]
+
+
+def source_spec(with_text: bool, with_vectors: bool = False):
+    fields = (SOURCE_FIELDS if with_text else []) + ([VECTOR_FIELD] if with_vectors else [])
+    return fields or False
+
+
+def bm25_body(query: str, topn: int = 50, with_text: bool = False, with_vectors: bool = False) -> dict:
+    return {
+        "size": topn,
+        "query": {"multi_match": {"query": query, "fields": ["title^2", "body"]}},
+        "_source": source_spec(with_text, with_vectors),
+    }
+
+
+def knn_body(query_vec: list, topn: int = 50, candidates: int = 100, with_text: bool = False,
+             with_vectors: bool = False) -> dict:
+    return {
+        "size": topn,
+        "knn": {
+            "field": "embedding",
+            "query_vector": query_vec,
+            "k": topn,
+            "num_candidates": candidates,
+        },
+        "_source": source_spec(with_text, with_vectors),
+    }
+
+
+def hybrid_rrf_body(query: str, query_vec: list, rcfg, with_text: bool = False, with_vectors: bool = False) -> dict:
+    """BM25 query + kNN clause fused by Elasticsearch itself (rank.rrf, ES >= 8.8)."""
+    body = bm25_body(query, rcfg.rerank_topn, with_text, with_vectors)
+    body["knn"] = knn_body(query_vec, rcfg.topn, rcfg.knn_candidates)["knn"]
+    body["rank"] = {"rrf": {"window_size": max(rcfg.topn, rcfg.rerank_topn), "rank_constant": rcfg.rrf_k}}
+    return body
+
+
+def doc_text(src: dict) -> str:
+    return f"{src.get('title','')}\n\n{src.get('body','')}"
+
+
+def hit_ids(resp, texts: Optional[dict] = None, vectors: Optional[dict] = None) -> list:
+    """Ranked ids from a search response; inline title/body go into `texts` and embeddings into `vectors` when given."""
+    hits = resp.get("hits", {}).get("hits", [])  # filter_path drops "hits" entirely on zero hits
+    for hit in hits:
+        src = hit.get("_source")
+        if not src:
+            continue
+        if texts is not None and ("title" in src or "body" in src):
+            texts[hit["_id"]] = doc_text(src)
+        if vectors is not None and VECTOR_FIELD in src:
+            vectors[hit["_id"]] = src[VECTOR_FIELD]
+    return [hit["_id"] for hit in hits]
+
+
+def doc_texts_from_mget(resp) -> dict:
+    out = {}
+    for doc in resp.get("docs", []):
+        if not doc.get("found"):
+            continue
+        out[doc["_id"]] = doc_text(doc["_source"])
+    return out
+
+
+def doc_vectors_from_mget(resp) -> dict:
+    return {
+        doc["_id"]: doc["_source"][VECTOR_FIELD]
+        for doc in resp.get("docs", [])
+        if doc.get("found") and VECTOR_FIELD in doc.get("_source", {})
+    }
+
+
+def bm25_search(es, index: str, query: str, topn: int = 50, texts: Optional[dict] = None,
+                vectors: Optional[dict] = None) -> list:
+    body = bm25_body(query, topn, texts is not None, vectors is not None)
+    resp = call_es("bm25", es.search, index=index, filter_path=SEARCH_FILTER_PATH, **body)
+    return hit_ids(resp, texts, vectors)
+
+
+def knn_search(es, index: str, query_vec: list, topn: int = 50, candidates: int = 100,
+               texts: Optional[dict] = None, vectors: Optional[dict] = None) -> list:
+    body = knn_body(query_vec, topn, candidates, texts is not None, vectors is not None)
+    resp = call_es("knn", es.search, index=index, filter_path=SEARCH_FILTER_PATH, **body)
+    return hit_ids(resp, texts, vectors)
+
+
+def hybrid_rrf_search(es, index: str, query: str, query_vec: list, rcfg, texts: Optional[dict] = None,
+                      vectors: Optional[dict] = None) -> list:
+    body = hybrid_rrf_body(query, query_vec, rcfg, texts is not None, vectors is not None)
+    resp = call_es("server_rrf", es.search, index=index, filter_path=SEARCH_FILTER_PATH, **body)
+    return hit_ids(resp, texts, vectors)
+
+
+def fetch_doc_texts(es, index: str, doc_ids: list) -> dict:
+    if not doc_ids:
+        return {}
+    resp = call_es("mget_texts", es.mget, index=index, ids=doc_ids, _source_includes=SOURCE_FIELDS,
+                   filter_path=MGET_FILTER_PATH)
+    return doc_texts_from_mget(resp)
+
+
+def fetch_doc_vectors(es, index: str, doc_ids: list) -> dict:
+    if not doc_ids:
+        return {}
+    resp = call_es("mget_vectors", es.mget, index=index, ids=doc_ids, _source_includes=[VECTOR_FIELD],
+                   filter_path=MGET_FILTER_PATH)
+    return doc_vectors_from_mget(resp)
+
+
+async def bm25_search_async(aes, index: str, query: str, topn: int = 50, texts: Optional[dict] = None,
+                            vectors: Optional[dict] = None) -> list:
+    body = bm25_body(query, topn, texts is not None, vectors is not None)
+    resp = await acall_es("bm25", aes.search, index=index, filter_path=SEARCH_FILTER_PATH, **body)
+    return hit_ids(resp, texts, vectors)
+
+
+async def knn_search_async(aes, index: str, query_vec: list, topn: int = 50, candidates: int = 100,
+                           texts: Optional[dict] = None, vectors: Optional[dict] = None) -> list:
+    body = knn_body(query_vec, topn, candidates, texts is not None, vectors is not None)
+    resp = await acall_es("knn", aes.search, index=index, filter_path=SEARCH_FILTER_PATH, **body)
+    return hit_ids(resp, texts, vectors)
+
+
+async def hybrid_rrf_search_async(aes, index: str, query: str, query_vec: list, rcfg,
+                                  texts: Optional[dict] = None, vectors: Optional[dict] = None) -> list:
+    body = hybrid_rrf_body(query, query_vec, rcfg, texts is not None, vectors is not None)
+    resp = await acall_es("server_rrf", aes.search, index=index, filter_path=SEARCH_FILTER_PATH, **body)
+    return hit_ids(resp, texts, vectors)
+
+
+async def fetch_doc_texts_async(aes, index: str, doc_ids: list) -> dict:
+    if not doc_ids:
+        return {}
+    resp = await acall_es("mget_texts", aes.mget, index=index, ids=doc_ids, _source_includes=SOURCE_FIELDS,
+                                filter_path=MGET_FILTER_PATH)
+    return doc_texts_from_mget(resp)
+
+
+async def fetch_doc_vectors_async(aes, index: str, doc_ids: list) -> dict:
+    if not doc_ids:
+        return {}
+    resp = await acall_es("mget_vectors", aes.mget, index=index, ids=doc_ids, _source_includes=[VECTOR_FIELD],
+                                filter_path=MGET_FILTER_PATH)
+    return doc_vectors_from_mget(resp)
+
+
+def hit_scores(resp) -> List[Tuple[str, float]]:
+    return [(hit["_id"], float(hit.get("_score") or 0.0)) for hit in resp.get("hits", {}).get("hits", [])]
+
+
+def attribute_ms(batch_ms: float, tooks: list) -> list:
+    """Split one round trip's wall time across its sub-searches, weighted by server `took` (1 ms floor)."""
+    weights = [max(t, 0) + 1 for t in tooks]
+    total = sum(weights)
+    return [batch_ms * w / total for w in weights]
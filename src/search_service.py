@@ -0,0 +1,161 @@
+"""Long-running /search endpoint over the hybrid pipeline in src.pipeline."""
+
+from __future__ import annotations
+
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from src.config import get_fusion_mode
+from src.pipeline import process_query
+from src.tracing import get_tracer
+
+DEFAULT_SYSTEM = "hybrid_rrf_rerank"
+SYSTEMS = ("bm25", "knn", "hybrid_rrf", "hybrid_rrf_rerank")
+
+
+class ServiceStats:
+    """Request/error counts and mean per-stage ms since start; cheap enough to update on every request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self._stage_sums: Dict[str, float] = {}
+
+    def begin(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def end(self, latency: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            if latency is None:
+                self.errors += 1
+                return
+            self.requests += 1
+            for k, v in latency.items():
+                if k.endswith("_ms") and isinstance(v, (int, float)):
+                    self._stage_sums[k] = self._stage_sums.get(k, 0.0) + v
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            uptime = time.monotonic() - self._started
+            done = self.requests
+            return {
+                "requests": done,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "uptime_s": uptime,
+                "qps": done / uptime if uptime > 0 else 0.0,
+                "mean_ms": {k: v / done for k, v in self._stage_sums.items()} if done else {},
+            }
+
+
+def make_handler(es, index: str, rcfg, stats: ServiceStats, limiter: threading.Semaphore):
+    ids = itertools.count(1)
+    systems = SYSTEMS + (("hybrid_rrf_server",) if get_fusion_mode() == "server" else ())
+    # Longest list any system returns: BM25/kNN come back at RETRIEVAL_TOPN, fused lists at RERANK_TOPN
+    max_size = max(rcfg.topn, rcfg.rerank_topn)
+
+    class SearchHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body go out as separate writes; avoid the delayed-ACK stall
+
+        def _send(self, code: int, obj: Dict[str, Any]) -> None:
+            data = json.dumps(obj).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _search(self, params: Dict[str, Any]) -> None:
+            query = str(params.get("query") or params.get("q") or "").strip()
+            if not query:
+                self._send(400, {"error": "missing query"})
+                return
+            try:
+                size = int(params.get("size", 10))
+            except (TypeError, ValueError):
+                self._send(400, {"error": "size must be an integer"})
+                return
+            if size < 1:
+                self._send(400, {"error": "size must be >= 1"})
+                return
+            size = min(size, max_size)
+            system = params.get("system", DEFAULT_SYSTEM)
+            if system not in systems:
+                self._send(400, {"error": f"unknown system {system!r}", "systems": sorted(systems)})
+                return
+
+            t0 = time.perf_counter()
+            stats.begin()
+            try:
+                with limiter:
+                    queue_ms = (time.perf_counter() - t0) * 1000
+                    record = process_query(es, index, rcfg, {"query_id": f"live-{next(ids)}", "query": query},
+                                           rerank=system == "hybrid_rrf_rerank")
+            except Exception as e:  # ES or model failure: report it, keep serving
+                stats.end(None)
+                self._send(500, {"error": str(e)})
+                return
+            latency = {k: v for k, v in record["latency"].items() if k != "query_id"}
+            latency["queue_ms"] = queue_ms
+            latency["service_ms"] = (time.perf_counter() - t0) * 1000
+            stats.end(latency)
+            results = [{"id": doc_id, "rank": i} for i, doc_id in enumerate(record["runs"][system][:size], start=1)]
+            self._send(200, {"query": query, "system": system, "results": results, "timings": latency})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/search":
+                self._search({k: v[0] for k, v in parse_qs(url.query).items()})
+            elif url.path == "/stats":
+                snapshot = stats.snapshot()
+                tracer = get_tracer()
+                if tracer is not None:
+                    snapshot["trace"] = tracer.summary()
+                self._send(200, snapshot)
+            elif url.path == "/healthz":
+                self._send(200, {"status": "ok"})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/search":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", "0"))
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError as e:
+                self._send(400, {"error": f"bad request: {e}"})
+                return
+            self._search(body if isinstance(body, dict) else {})
+
+        def log_message(self, format, *args):
+            pass
+
+    return SearchHandler
+
+
+def serve(es, index: str, rcfg, host: str, port: int, max_inflight: int = 8) -> None:
+    stats = ServiceStats()
+    server = ThreadingHTTPServer((host, port), make_handler(es, index, rcfg, stats, threading.Semaphore(max(1, max_inflight))))
+    server.daemon_threads = True
+    print(f"Search service on http://{host}:{port}/ (GET|POST /search, GET /stats, GET /healthz)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if get_tracer() is not None:
+            get_tracer().flush()
@@ -0,0 +1,80 @@
+"""Paired bootstrap and randomization tests over per-query metric arrays, vectorized across resamples."""
+
+from __future__ import annotations
+
+from itertools import combinations
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+def align(query_ids: Dict[str, List[str]], scores: Dict[str, np.ndarray]) -> np.ndarray:
+    """Stack per-system arrays (systems x queries) over the queries every system answered."""
+    names = list(scores)
+    common = set(query_ids[names[0]])
+    for name in names[1:]:
+        common &= set(query_ids[name])
+    order = [q for q in query_ids[names[0]] if q in common]
+    rows = []
+    for name in names:
+        pos = {q: i for i, q in enumerate(query_ids[name])}
+        rows.append(scores[name][[pos[q] for q in order]])
+    return np.vstack(rows) if rows else np.zeros((0, 0))
+
+
+def paired_tests(
+    per_metric: Dict[str, np.ndarray],
+    names: Sequence[str],
+    n_resamples: int = 10000,
+    alpha: float = 0.05,
+    seed: int = 0,
+) -> List[dict]:
+    """Compare every pair (later system minus earlier system) on every metric.
+
+    per_metric maps a metric name to a (systems x queries) array from align(). Bootstrap
+    resamples are drawn once as (R x n) count matrices, so all system means for all
+    resamples come out of one matrix product per metric. The randomization test flips
+    the sign of each per-query difference, again one product for all pairs. Every pair
+    and metric shares the same resamples.
+    """
+    arrays = list(per_metric.values())
+    if not arrays:
+        return []
+    n_sys, n = arrays[0].shape
+    pairs = list(combinations(range(n_sys), 2))
+    if n == 0 or not pairs:
+        return []
+    rng = np.random.default_rng(seed)
+
+    draws = rng.integers(0, n, size=(n_resamples, n))
+    draws += np.arange(n_resamples)[:, None] * n
+    counts = np.bincount(draws.ravel(), minlength=n_resamples * n).reshape(n_resamples, n).astype(np.float64)
+    del draws
+    signs = (rng.integers(0, 2, size=(n_resamples, n), dtype=np.int8) * 2 - 1).astype(np.float64)
+
+    out = []
+    for metric, per_system in per_metric.items():
+        boot_means = counts @ per_system.T / n  # R x S
+        diffs = np.stack([per_system[b] - per_system[a] for a, b in pairs], axis=1)  # n x P
+        observed = diffs.mean(axis=0)
+        perm = signs @ diffs / n  # R x P
+        for j, (a, b) in enumerate(pairs):
+            boot = boot_means[:, b] - boot_means[:, a]
+            lo, hi = np.quantile(boot, [alpha / 2, 1 - alpha / 2])
+            obs = observed[j]
+            # Bootstrap p: how often the centred resampled difference is at least as extreme as observed
+            p_boot = (np.count_nonzero(np.abs(boot - obs) >= abs(obs)) + 1) / (n_resamples + 1)
+            p_rand = (np.count_nonzero(np.abs(perm[:, j]) >= abs(obs) - 1e-12) + 1) / (n_resamples + 1)
+            out.append({
+                "metric": metric,
+                "system": names[b],
+                "baseline": names[a],
+                "mean": float(per_system[b].mean()),
+                "baseline_mean": float(per_system[a].mean()),
+                "diff": float(obs),
+                "ci_low": float(lo),
+                "ci_high": float(hi),
+                "p_bootstrap": float(p_boot),
+                "p_randomization": float(p_rand),
+            })
+    return out
@@ -0,0 +1,170 @@
+"""Lightweight nested spans: contextvars for parenting, perf_counter_ns for timing, JSONL export.
+
+Tracing is off until configure() is given a path (TRACE_PATH); span() then returns a shared no-op.
+stage() always measures into a timings dict (latency.csv needs it) and adds a span only when on.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.histogram import Histogram
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[1]
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_ids = itertools.count(1)
+_tracer: Optional["Tracer"] = None
+
+
+class Span:
+    __slots__ = ("name", "attrs", "span_id", "parent_id", "trace_id", "start_ns", "end_ns", "_token")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        parent = _current.get()
+        self.span_id = next(_ids)
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self._token = _current.set(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end_ns = time.perf_counter_ns()
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        tracer = _tracer
+        if tracer is not None:
+            tracer.emit(self)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class Tracer:
+    """Buffers finished spans and appends them to a JSONL file; keeps a duration histogram per span name."""
+
+    def __init__(self, path: Path, flush_every: int = 512):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._hists: Dict[str, Histogram] = {}
+        self._fh = self.path.open("a", encoding="utf-8")
+
+    def emit(self, span: Span) -> None:
+        dur_ms = (span.end_ns - span.start_ns) / 1e6
+        line = json.dumps({
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "name": span.name,
+            "start_ns": span.start_ns,
+            "dur_ms": dur_ms,
+            **({"attrs": span.attrs} if span.attrs else {}),
+        })
+        with self._lock:
+            self._buffer.append(line)
+            self._hists.setdefault(span.name, Histogram()).record(dur_ms)
+            if len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._buffer:
+            self._fh.write("\n".join(self._buffer) + "\n")
+            self._fh.flush()
+            self._buffer.clear()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            self._fh.close()
+
+    def summary(self, percentiles=(50, 95, 99, 99.9)) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {name: h.summary(percentiles) for name, h in sorted(self._hists.items())}
+
+
+def get_trace_path() -> Optional[Path]:
+    """TRACE_PATH enables tracing to that JSONL file; empty (default) disables it."""
+    path = os.getenv("TRACE_PATH", "").strip()
+    if not path:
+        return None
+    p = Path(path)
+    return (_PROJECT_ROOT / p) if not p.is_absolute() else p
+
+
+def configure(path: Optional[Path]) -> Optional[Tracer]:
+    """Start tracing to `path` (None turns it off); closes any previous tracer."""
+    global _tracer
+    old, _tracer = _tracer, (Tracer(path) if path else None)
+    if old is not None:
+        old.close()
+    return _tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+def span(name: str, **attrs):
+    return Span(name, attrs) if _tracer is not None else _NOOP
+
+
+class stage:
+    """`with stage("bm25", timings):` stores timings["bm25_ms"] and, when tracing, emits a span."""
+
+    __slots__ = ("key", "timings", "_span", "_t0")
+
+    def __init__(self, name: str, timings: Dict[str, Any], key: Optional[str] = None, **attrs):
+        self.key = key or f"{name}_ms"
+        self.timings = timings
+        self._span = span(name, **attrs)
+
+    def __enter__(self):
+        self._span.__enter__()
+        self._t0 = time.perf_counter_ns()
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.timings[self.key] = (time.perf_counter_ns() - self._t0) / 1e6
+        return self._span.__exit__(exc_type, exc, tb)
+
+
+def write_summary(tracer: Tracer, path: Path) -> Dict[str, Dict[str, float]]:
+    summary = tracer.summary()
+    Path(path).write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    return summary
@@ -2,7 +2,9 @@ import hashlib
 import json
 import os
 from pathlib import Path
-from typing import Iterable, Dict, Any, List, Union
+import sys
+import time
+from typing import Iterable, Iterator, Dict, Any, List, Union
 
 from dotenv import find_dotenv, load_dotenv
 
@@ -29,16 +31,53 @@ def get_report_dir(data_dir: Path) -> Path:
     return REPORTS_BASE / f"{name}_{slug}"
 
 
-def read_jsonl(path: Union[str, Path]) -> List[Dict[str, Any]]:
+def iter_jsonl(path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
     path = Path(path)
-    out = []
     with path.open("r", encoding="utf-8") as f:
         for line in f:
             line = line.strip()
             if not line:
                 continue
-            out.append(json.loads(line))
-    return out
+            yield json.loads(line)
+
+
+def read_jsonl(path: Union[str, Path]) -> List[Dict[str, Any]]:
+    return list(iter_jsonl(path))
+
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (0.0 where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def rss_mb() -> float:
+    """Current resident set size in MB: /proc on Linux, psutil elsewhere, else the peak."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return peak_rss_mb()
+    return psutil.Process().memory_info().rss / (1024 * 1024)
 
 def write_json(path: Union[str, Path], obj: Any) -> None:
     path = Path(path)
@@ -49,3 +88,9 @@ def write_text(path: Union[str, Path], text: str) -> None:
     path = Path(path)
     path.parent.mkdir(parents=True, exist_ok=True)
     path.write_text(text, encoding="utf-8")
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, (time.perf_counter() - t0) * 1000
@@ -0,0 +1,93 @@
+"""Concurrent rerank() calls share one cross-encoder, as under 04 --concurrency and the search service."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import src.rerank as rerank_mod
+
+
+class BorrowCheckingTokenizer:
+    """Mimics the HF fast tokenizer: a call whose truncation/padding settings differ from the current
+    ones must re-borrow the Rust tokenizer mutably, which fails while another thread is using it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._settings = None
+        self._active = 0
+
+    def __call__(self, queries, docs, **settings):
+        key = tuple(sorted(settings.items()))
+        with self._lock:
+            if key != self._settings:
+                if self._active:
+                    raise RuntimeError("Already borrowed")
+                self._settings = key
+            self._active += 1
+        try:
+            time.sleep(0.001)
+            return {"length": [len(q) + len(d) for q, d in zip(queries, docs)]}
+        finally:
+            with self._lock:
+                self._active -= 1
+
+
+class FakeCrossEncoder:
+    def __init__(self):
+        self.tokenizer = BorrowCheckingTokenizer()
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        import numpy as np
+        for i in range(0, len(pairs), batch_size):
+            chunk = pairs[i:i + batch_size]
+            self.tokenizer([q for q, _ in chunk], [d for _, d in chunk], padding=True, truncation="longest_first")
+        return np.array([float(len(d)) for _, d in pairs])
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    monkeypatch.setenv("RERANK_MODE", "local")
+    monkeypatch.setenv("RERANK_LENGTH_BUCKETING", "true")
+    monkeypatch.setenv("RERANK_BATCH_SIZE", "4")
+    monkeypatch.delenv("RERANK_CACHE_PATH", raising=False)
+    model = FakeCrossEncoder()
+    monkeypatch.setattr(rerank_mod, "get_cross_encoder", lambda *a, **kw: model)
+    return model
+
+
+def test_concurrent_rerank(fake_model):
+    def one(i):
+        docs = [(f"d{j}", "x" * ((i * 7 + j * 13) % 50 + 1)) for j in range(20)]
+        ranked = rerank_mod.rerank(f"query {i}", docs)
+        expected = sorted(docs, key=lambda d: len(d[1]), reverse=True)
+        assert [s for _, s in ranked] == [float(len(t)) for _, t in expected]
+        return len(ranked)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert list(pool.map(one, range(64))) == [20] * 64
+
+
+def test_padding_stats_without_bucketing(fake_model, monkeypatch):
+    monkeypatch.setenv("RERANK_LENGTH_BUCKETING", "false")
+    before = rerank_mod.rerank_stats()
+    rerank_mod.rerank("q", [(f"d{j}", "x" * (1 + 37 * (j % 2))) for j in range(8)])
+    after = rerank_mod.rerank_stats()
+    assert after["bucketing"] is False
+    assert after["pairs"] - before["pairs"] == 8
+    assert after["efficiency_sorted"] > after["efficiency_unsorted"]
+
+
+def test_concurrent_cache_counts(fake_model, monkeypatch, tmp_path):
+    from src.rerank_cache import _open_cache, get_rerank_cache
+    monkeypatch.setenv("RERANK_CACHE_PATH", str(tmp_path / "scores.sqlite"))
+    _open_cache.cache_clear()
+    try:
+        docs = [(f"d{j}", "x" * (j + 1)) for j in range(10)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda i: rerank_mod.rerank(f"query {i % 4}", docs), range(64)))
+        st = get_rerank_cache().stats()
+        assert st["hits"] + st["misses"] == 64 * len(docs)
+    finally:
+        _open_cache.cache_clear()